@@ -1,8 +1,10 @@
 import sys
+from functools import lru_cache
 import numpy as np
 from scipy.io.wavfile import read
-from scipy.signal import find_peaks, butter, filtfilt
-import matplotlib.pyplot as plt
+from scipy.signal import butter, sosfilt
+import profiling
+from DTMFencode import profile_of, remove_repeats, repeat_symbol
 
 # Define DTMF frequencies
 dtmf_freqs = {
@@ -12,98 +14,915 @@ dtmf_freqs = {
     '*': (941, 1209), '0': (941, 1336), '#': (941, 1477), 'D': (941, 1633)
 }
 
-# High-pass filter to remove low-frequency noise
-def highpass_filter(data, sample_rate, cutoff=650):
-    nyquist = 0.5 * sample_rate
-    normal_cutoff = cutoff / nyquist
-    b, a = butter(1, normal_cutoff, btype='high', analog=False)
-    return filtfilt(b, a, data)
-
-# Low-pass filter to remove high-frequency noise
-def lowpass_filter(data, sample_rate, cutoff=1700):
-    nyquist = 0.5 * sample_rate
-    normal_cutoff = cutoff / nyquist
-    b, a = butter(1, normal_cutoff, btype='low', analog=False)
-    return filtfilt(b, a, data)
-
-# Combine high-pass and low-pass filtering
-def bandpass_filter(data, sample_rate):
-    data = highpass_filter(data, sample_rate, cutoff=650)
-    return lowpass_filter(data, sample_rate, cutoff=1700)
+# Goertzel bank layout: the 4 row tones followed by the 4 column tones.
+# A digit is looked up row-major in dtmf_keypad, i.e. dtmf_keypad[4 * row + col].
+row_freqs = (697, 770, 852, 941)
+col_freqs = (1209, 1336, 1477, 1633)
+dtmf_keypad = "123A456B789C*0#D"
+
+# DTMF band kept by the front-end and the rate everything after it runs at
+passband = (650, 1700)
+target_rate = 8000
+
+# Goertzel frame length; 205 samples at 8 kHz is the usual choice for DTMF
+frame_duration = 205 / 8000
+
+# Band-pass design as second-order sections, computed once per sample rate
+@lru_cache(maxsize=None)
+def bandpass_sos(sample_rate, order=4):
+    return butter(order, passband, btype='bandpass', fs=sample_rate, output='sos').astype(np.float32)
+
+# Band-pass filter to isolate DTMF-relevant frequencies, in float32
+def bandpass_filter(data, sample_rate, zi=None):
+    """
+    Filter along the last axis. When zi is given the final filter state is
+    returned alongside the output so the next block can continue from it.
+
+    A tiny DC offset is added first: the band-pass removes it, but it keeps
+    the filter state from decaying into denormals during digital silence,
+    which makes sosfilt an order of magnitude slower.
+    """
+    data = np.asarray(data, dtype=np.float32) + np.float32(1e-6)
+    if zi is None:
+        return sosfilt(bandpass_sos(sample_rate), data)
+    return sosfilt(bandpass_sos(sample_rate), data, zi=zi)
+
+class BandpassDecimator:
+    """
+    Band-pass to the DTMF band and decimate to about target_rate.
+
+    The band-pass doubles as the anti-aliasing filter, so decimating is a
+    stride over its output. Filter state and decimation phase carry over
+    between calls: feeding a signal in blocks gives the same samples as
+    feeding it in one piece. Blocks may be 2-D (streams, samples).
+    """
+
+    def __init__(self, sample_rate, target_rate=target_rate):
+        self.sample_rate = sample_rate
+        self.factor = max(1, int(sample_rate // target_rate))
+        self.output_rate = sample_rate / self.factor
+        self.zi = None
+        self.phase = 0
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        if self.zi is None:
+            sections = bandpass_sos(self.sample_rate).shape[0]
+            self.zi = np.zeros((sections,) + block.shape[:-1] + (2,), dtype=np.float32)
+
+        with profiling.stage("bandpass_decimate", block.shape[-1]):
+            filtered, self.zi = bandpass_filter(block, self.sample_rate, self.zi)
+            decimated = np.ascontiguousarray(filtered[..., self.phase::self.factor])
+        self.phase = (self.phase - block.shape[-1]) % self.factor
+        return decimated
+
+# Front-end stage: band-pass and decimate a whole signal in one go
+def frontend(data, sample_rate):
+    decimator = BandpassDecimator(sample_rate)
+    return decimator.process(data), decimator.output_rate
+
+# Find runs of True in a boolean mask lasting at least min_length samples
+def find_runs(mask, min_length):
+    edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = ends - starts >= min_length
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+# Short-time RMS envelope along the last axis, centred on each sample
+def rms_envelope(data, sample_rate, window_duration=0.005):
+    window = max(1, int(window_duration * sample_rate))
+    # Zero padding centres the window; the extra leading zero starts the cumulative sum at 0
+    padding = [(0, 0)] * (data.ndim - 1) + [(window // 2 + 1, window - window // 2 - 1)]
+    cumulative = np.cumsum(np.pad(np.square(data, dtype=np.float64), padding), axis=-1)
+    return np.sqrt(np.maximum(cumulative[..., window:] - cumulative[..., :-window], 0) / window)
+
+# Silence threshold derived from the noise floor instead of the loudest sample
+def adaptive_threshold(envelope, threshold, noise_factor=2.0):
+    """
+    Put the threshold noise_factor above the noise floor (10th percentile of
+    the envelope), but never below threshold times the typical tone level
+    (99th percentile). Percentiles keep a single click from moving either.
+    """
+    noise_floor, tone_level = np.percentile(envelope, [10, 99])
+    return max(noise_factor * noise_floor, threshold * tone_level)
 
 # Detect silent regions to segment tones
-def detect_silent_regions(data, sample_rate, threshold=0.02, min_silence_duration=0.1):
-    """Detect silent regions in the audio based on amplitude."""
-    abs_data = np.abs(data)
-    silence_threshold = threshold * np.max(abs_data)
-    silence_samples = int(min_silence_duration * sample_rate)
-    
-    silent_regions = []
-    is_silent = False
-    start_idx = 0
-    
-    for i, value in enumerate(abs_data):
-        if value < silence_threshold:
-            if not is_silent:
-                is_silent = True
-                start_idx = i
+def detect_silent_regions(data, sample_rate, threshold=0.02, min_silence_duration=0.1, adaptive=False,
+                          silence_threshold=None):
+    """
+    Detect silent regions in the audio based on amplitude.
+
+    By default a sample is silent when its magnitude is below threshold times
+    the file maximum. With adaptive=True the short-time RMS envelope is
+    compared against adaptive_threshold instead. A precomputed absolute
+    silence_threshold skips the level estimate, e.g. when data is one block
+    of a longer file.
+
+    Returns:
+    - list: (start, end) sample ranges of silences at least
+      min_silence_duration long.
+    """
+    with profiling.stage("detect_silent_regions", len(data)):
+        envelope = rms_envelope(data, sample_rate) if adaptive else np.abs(data)
+        if silence_threshold is not None:
+            pass
+        elif adaptive:
+            silence_threshold = adaptive_threshold(envelope, threshold)
         else:
-            if is_silent and i - start_idx >= silence_samples:
-                silent_regions.append((start_idx, i))
-            is_silent = False
-    
-    if is_silent and len(data) - start_idx >= silence_samples:
-        silent_regions.append((start_idx, len(data)))
-    
-    return silent_regions
-
-def decode_dtmf(filename, visualize=False):
-    # Read the audio file
-    sample_rate, data = read(filename)
-    
-    # Use only one channel if stereo
-    if data.ndim > 1:
-        data = data[:, 0]
+            silence_threshold = threshold * np.max(envelope) if len(envelope) else 0
+        silence_samples = int(min_silence_duration * sample_rate)
 
-    # Apply band-pass filter to isolate DTMF-relevant frequencies
-    data = bandpass_filter(data, sample_rate)
+        return find_runs(envelope < silence_threshold, silence_samples)
 
-    # Detect silent regions
-    silent_regions = detect_silent_regions(data, sample_rate)
+# Goertzel filter bank evaluated on all frames at once
+def goertzel_energies(data, sample_rate, freqs=row_freqs + col_freqs, frame_duration=frame_duration):
+    """
+    Compute the Goertzel energy of every sliding frame at each frequency.
 
-    # Segment audio into tones using silence gaps
-    detected_digits = []
+    Frames are frame_duration long with 50% overlap, so frame i covers
+    data[..., i * hop:i * hop + frame_length]. Each frequency is evaluated
+    exactly rather than at the nearest FFT bin, which makes the result
+    independent of segment length. data may be 2-D (streams, samples).
+
+    Returns:
+    - np.ndarray: energies with shape (..., n_frames, len(freqs)).
+    - int: frame_length in samples.
+    - int: hop in samples.
+    """
+    frame_length = max(1, int(round(frame_duration * sample_rate)))
+    hop = max(1, frame_length // 2)
+    if data.shape[-1] < frame_length:
+        return np.zeros(data.shape[:-1] + (0, len(freqs))), frame_length, hop
+
+    frames = np.lib.stride_tricks.sliding_window_view(data, frame_length, axis=-1)[..., ::hop, :]
+    phase = 2 * np.pi * np.outer(np.arange(frame_length), freqs) / sample_rate
+    real = frames @ np.cos(phase).astype(data.dtype)
+    imag = frames @ np.sin(phase).astype(data.dtype)
+    return real * real + imag * imag, frame_length, hop
+
+# Turn silent regions into the (start, end) sample ranges of the tones between them
+def tone_segments(silent_regions, min_length):
+    segments = []
+    too_short = 0
     start_idx = 0
     for silent_start, silent_end in silent_regions:
-        tone_segment = data[start_idx:silent_start]
+        if silent_start - start_idx >= min_length:
+            segments.append((start_idx, silent_start))
+        elif silent_start > start_idx:
+            too_short += 1
         start_idx = silent_end
 
-        if len(tone_segment) < int(0.05 * sample_rate):  # Ignore short segments
-            continue
+    profiling.count("segments_found", len(segments))
+    profiling.count("segments_too_short", too_short)
+    return segments
+
+# Sum the frame energies of the frames lying fully inside each segment
+def segment_energies(energies, frame_length, hop, segments):
+    cumulative = np.zeros((len(energies) + 1, energies.shape[1]))
+    np.cumsum(energies, axis=0, out=cumulative[1:])
+
+    bounds = np.asarray(segments, dtype=np.int64).reshape(-1, 2)
+    first = -(-bounds[:, 0] // hop)
+    last = (bounds[:, 1] - frame_length) // hop + 1
+    first = np.clip(first, 0, len(energies))
+    last = np.clip(last, first, len(energies))
+    return cumulative[last] - cumulative[first]
+
+# Map row/column energies to keypad indices, -1 where no valid digit is present
+def classify_tones(energies, min_ratio=2.0, max_twist=100.0):
+    """
+    Pick the strongest row and column tone and look the digit up on the keypad.
+
+    Parameters:
+    - energies: np.ndarray, shape (..., 8) in row_freqs + col_freqs order.
+    - min_ratio: float, how much stronger the winning tone of each group must
+      be than the runner-up.
+    - max_twist: float, largest allowed energy ratio between row and column tone.
+
+    Returns:
+    - np.ndarray: keypad indices with the leading shape of energies.
+    """
+    rows = np.sort(energies[..., :4], axis=-1)
+    cols = np.sort(energies[..., 4:], axis=-1)
+    row_peak, col_peak = rows[..., -1], cols[..., -1]
+
+    valid = (row_peak > 0) & (col_peak > 0)
+    valid &= row_peak >= min_ratio * rows[..., -2]
+    valid &= col_peak >= min_ratio * cols[..., -2]
+    valid &= (row_peak <= max_twist * col_peak) & (col_peak <= max_twist * row_peak)
+
+    index = 4 * np.argmax(energies[..., :4], axis=-1) + np.argmax(energies[..., 4:], axis=-1)
+    return np.where(valid, index, -1)
+
+# Classify each tone segment of front-end output: keypad indices, -1 where no digit matched
+def classify_segments(data, sample_rate, segments):
+    # Run the Goertzel bank once over the whole signal and pool it per tone
+    with profiling.stage("goertzel", len(data)):
+        energies, frame_length, hop = goertzel_energies(data, sample_rate)
+        pooled = segment_energies(energies, frame_length, hop, segments)
+    with profiling.stage("classify_tones", len(segments)):
+        codes = classify_tones(pooled)
+
+    profiling.count("segments_unmatched", int(np.sum(codes < 0)))
+    profiling.count("digits_decoded", int(np.sum(codes >= 0)))
+    return codes
+
+# Classify each tone segment of front-end output and return the digits
+def decode_tones(data, sample_rate, segments):
+    if not segments:
+        return []
+    return [dtmf_keypad[code] for code in classify_segments(data, sample_rate, segments) if code >= 0]
+
+# Segment front-end output into tones using silence gaps, ignoring short segments
+def silence_segments(data, sample_rate, adaptive=False, min_silence_duration=0.1, min_tone_duration=0.05):
+    silent_regions = detect_silent_regions(data, sample_rate, min_silence_duration=min_silence_duration,
+                                           adaptive=adaptive)
+    return tone_segments(silent_regions, int(min_tone_duration * sample_rate))
+
+# Decode DTMF digits from raw samples
+def decode_signal(data, sample_rate, adaptive=False, min_silence_duration=0.1, min_tone_duration=0.05):
+    # Band-pass and decimate; everything below runs at the reduced rate
+    data, sample_rate = frontend(data, sample_rate)
+    segments = silence_segments(data, sample_rate, adaptive, min_silence_duration, min_tone_duration)
+    return decode_tones(data, sample_rate, segments)
+
+# Label every Goertzel frame with a keypad index, len(dtmf_keypad) for the repeat symbol, or -1
+def classify_frames(energies, min_ratio=2.0, gate=0.1):
+    """
+    Classify frames one by one, as gapless decoding has no silences to cut at.
+
+    The repeat symbol is the dual-row pair 697 + 852 Hz: both of those rows
+    must beat the other two rows and every column by min_ratio. Frames
+    weaker than gate times the 99th percentile frame energy are left
+    unlabelled, so noise between transmissions decodes to nothing.
+    """
+    codes = classify_tones(energies, min_ratio)
+
+    first_row, third_row = energies[..., 0], energies[..., 2]
+    others = np.max(energies[..., [1, 3, 4, 5, 6, 7]], axis=-1)
+    is_repeat = (np.minimum(first_row, third_row) >= min_ratio * others) & (others > 0)
+    codes = np.where(is_repeat, len(dtmf_keypad), codes)
+
+    total = np.sum(energies, axis=-1)
+    if total.size:
+        codes = np.where(total >= gate * np.percentile(total, 99), codes, -1)
+    return codes
+
+# Collapse per-frame labels into symbols: runs of at least min_frames equal
+# labels, with runs of the same symbol split only by short glitches merged.
+# Returns the symbols' labels and their first and past-the-end frames.
+def label_run_bounds(labels, min_frames):
+    if not len(labels):
+        return labels, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    change = np.flatnonzero(np.diff(labels)) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [len(labels)]))
+    keep = (labels[starts] >= 0) & (ends - starts >= min_frames)
+    run_labels, starts, ends = labels[starts][keep], starts[keep], ends[keep]
+    if not len(run_labels):
+        return run_labels, starts, ends
+    distinct = np.ones(len(run_labels), dtype=bool)
+    distinct[1:] = run_labels[1:] != run_labels[:-1]
+    # A merged symbol ends where the last run before the next symbol does
+    first = np.flatnonzero(distinct)
+    last = np.append(first[1:], len(run_labels)) - 1
+    return run_labels[first], starts[first], ends[last]
+
+def label_runs(labels, min_frames):
+    return label_run_bounds(labels, min_frames)[0]
+
+# Symbols of gapless front-end output: their labels (see classify_frames)
+# and the first and past-the-end samples of the frames they were heard in
+def gapless_symbols(data, sample_rate, tone_duration):
+    # Frames a third of a tone long give several clean frames per symbol while
+    # still resolving the 73 Hz spacing of the lowest two rows
+    with profiling.stage("goertzel", len(data)):
+        energies, frame_length, hop = goertzel_energies(data, sample_rate, frame_duration=tone_duration / 3)
+    with profiling.stage("classify_tones", len(energies)):
+        labels = classify_frames(energies)
+    frames_per_tone = (int(tone_duration * sample_rate) - frame_length) // hop + 1
+    codes, starts, ends = label_run_bounds(labels, max(1, frames_per_tone // 2))
+    return codes, starts * hop, (ends - 1) * hop + frame_length
+
+# Decode a gapless transmission (see DTMFencode.insert_repeats)
+def decode_gapless(data, sample_rate, tone_duration):
+    data, sample_rate = frontend(data, sample_rate)
+    codes = gapless_symbols(data, sample_rate, tone_duration)[0]
+
+    profiling.count("digits_decoded", len(codes))
+    keypad = dtmf_keypad + repeat_symbol
+    return list(remove_repeats("".join(keypad[code] for code in codes)))
+
+# Silence and tone lengths to segment a gapped profile with. Filter ringing
+# eats into the gaps and the ramps into the tones, so only part of each is required.
+def profile_durations(timing):
+    profile = profile_of(timing)
+    return {"min_silence_duration": 0.75 * profile['gap'], "min_tone_duration": 0.5 * profile['tone']}
+
+def decode_profile(data, sample_rate, timing, adaptive=False):
+    """
+    Decode DTMF digits sent with a timing profile.
+
+    Parameters:
+    - timing: str or float, a name in DTMFencode.profiles, or the pulse
+      length in seconds the signal was encoded with.
+
+    Returns:
+    - list: the decoded digits.
+    """
+    profile = profile_of(timing)
+    if not profile['gap']:
+        return decode_gapless(data, sample_rate, profile['tone'])
+    return decode_signal(data, sample_rate, adaptive, **profile_durations(timing))
+
+# Tones of a recording with where they lie, for display
+def tone_annotations(data, sample_rate, timing=None, adaptive=False, block_size=1 << 20):
+    """
+    Segment and classify tones with the functions decode_profile uses
+    (decode_signal's without a timing profile), keeping each tone's position.
+
+    The front-end runs block by block, so besides data (which may be a
+    memory map) only the decimated signal is held, never a float copy of
+    the full-rate one.
+
+    Returns:
+    - list: (start, end, symbol) per tone, times in seconds; symbol is '?'
+      for a tone that matched no digit.
+    - np.ndarray: the front-end output.
+    - float: its sample rate.
+    """
+    decimator = BandpassDecimator(sample_rate)
+    filtered = np.concatenate([np.zeros(0, dtype=np.float32)] +
+                              [decimator.process(data[start:start + block_size])
+                               for start in range(0, len(data), block_size)])
+    rate = decimator.output_rate
+
+    profile = profile_of(timing) if timing is not None else None
+    if profile is not None and not profile['gap']:
+        codes, starts, ends = gapless_symbols(filtered, rate, profile['tone'])
+        keypad = dtmf_keypad + repeat_symbol
+        annotations = [(start / rate, end / rate, keypad[code])
+                       for code, start, end in zip(codes.tolist(), starts.tolist(), ends.tolist())]
+        return annotations, filtered, rate
+
+    durations = profile_durations(timing) if profile is not None else {}
+    segments = silence_segments(filtered, rate, adaptive, **durations)
+    codes = classify_segments(filtered, rate, segments) if segments else []
+    annotations = [(start / rate, end / rate, dtmf_keypad[code] if code >= 0 else '?')
+                   for (start, end), code in zip(segments, codes)]
+    return annotations, filtered, rate
+
+# Start samples of the tones in front-end output: tone segments after
+# silences in gapped profiles, label changes in gapless ones
+def tone_onsets(data, sample_rate, timing):
+    profile = profile_of(timing)
+    if profile['gap']:
+        return [start for start, end in silence_segments(data, sample_rate, True, **profile_durations(timing))]
+    # The first frame to take a tone's label starts about where the tone does
+    return gapless_symbols(data, sample_rate, profile['tone'])[1].tolist()
+
+# Fit onset = offset + k * slot_length to tone onsets, ignoring onsets off the grid
+def fit_slot_grid(onsets, slot_length):
+    """
+    The phase comes from the circular mean of all onsets modulo the slot
+    length, so a spurious first onset does not shift it. Least squares on
+    the onsets within a quarter slot of the grid then refines offset and
+    slot length, which absorbs clock drift between sender and receiver.
+    """
+    onsets = np.asarray(onsets, dtype=np.float64)
+    angle = np.angle(np.mean(np.exp(2j * np.pi * onsets / slot_length)))
+    offset = angle / (2 * np.pi) * slot_length
+    for _ in range(2):
+        k = np.round((onsets - offset) / slot_length)
+        inliers = np.abs(onsets - offset - k * slot_length) < slot_length / 4
+        if len(np.unique(k[inliers])) < 2:
+            break
+        slot_length, offset = np.polyfit(k[inliers], onsets[inliers], 1)
+    return offset, slot_length
+
+# Ratio of a winning tone's energy to the runner-up's, capped at 1e6 and 0 where there is no tone
+def tone_ratio(peak, second):
+    return peak / np.maximum(second, 1e-6 * peak + np.finfo(np.float64).tiny)
+
+def decode_slots(data, sample_rate, timing, gate=0.1, echo=0.25):
+    """
+    Decode one symbol per time slot, for framed transmissions (see framing.py).
+
+    Segmenting at silences turns a lost tone into a missing digit and a
+    split one into an extra digit, which shifts everything after it. Here
+    the symbol slots are a grid fitted to all tone onsets, and every slot
+    yields exactly one symbol, read over the middle half of its tone. A
+    slot that cannot be classified is '?' and stays in place, so the error
+    correction sees an erasure rather than a shift. In gapless profiles a
+    repeat symbol takes the digit of the slot before it.
+
+    Returns:
+    - list: one digit or '?' per slot.
+    - np.ndarray: the confidence of each symbol, the smaller of the winning
+      row and column tones' ratios to their runners-up (0 for '?').
+    """
+    profile = profile_of(timing)
+    data, sample_rate = frontend(data, sample_rate)
+    onsets = tone_onsets(data, sample_rate, timing)
+    if not onsets:
+        return [], np.zeros(0)
+    offset, slot_length = fit_slot_grid(onsets, (profile['tone'] + profile['gap']) * sample_rate)
+
+    tone_length = profile['tone'] * sample_rate
+    window = int(tone_length / 2)
+    first = int(np.ceil(-(offset + tone_length / 4) / slot_length))
+    last = int(np.floor((len(data) - window - offset - tone_length / 4) / slot_length))
+    if last < first:
+        return [], np.zeros(0)
+
+    with profiling.stage("goertzel", (last - first + 1) * window):
+        starts = (offset + tone_length / 4 + slot_length * np.arange(first, last + 1)).astype(np.int64)
+        windows = data[starts[:, None] + np.arange(window)]
+        energies = goertzel_energies(windows, sample_rate, frame_duration=window / sample_rate)[0][:, 0, :]
+
+    with profiling.stage("classify_tones", len(energies)):
+        # Without gaps the previous symbol is still ringing in the room; take its echo off
+        if not profile['gap']:
+            energies[1:] = np.maximum(energies[1:] - echo * energies[:-1], 0)
+        # Every slot that is not silent gets its best guess; confidence tells how good it is
+        codes = classify_frames(energies, min_ratio=1.0, gate=gate)
+        rows = np.sort(energies[:, :4], axis=1)
+        cols = np.sort(energies[:, 4:], axis=1)
+        confidence = np.minimum(tone_ratio(rows[:, -1], rows[:, -2]), tone_ratio(cols[:, -1], cols[:, -2]))
+        others = np.max(energies[:, [1, 3, 4, 5, 6, 7]], axis=1)
+        repeat_confidence = tone_ratio(np.minimum(energies[:, 0], energies[:, 2]), others)
+        confidence = np.where(codes == len(dtmf_keypad), repeat_confidence, confidence)
+        confidence = np.where(codes < 0, 0.0, confidence)
+
+    symbols = []
+    for i, code in enumerate(codes):
+        if code == len(dtmf_keypad):
+            # A repeat is only as good as the digit it repeats
+            symbols.append(symbols[-1] if symbols else '?')
+            confidence[i] = min(confidence[i], confidence[i - 1]) if i else 0.0
+        else:
+            symbols.append(dtmf_keypad[code] if code >= 0 else '?')
+    profiling.count("slots_erased", symbols.count('?'))
+    return symbols, confidence
+
+class BlockDecoder:
+    """
+    Decode DTMF incrementally from consecutive blocks of raw samples.
+
+    Filter state lives in a BandpassDecimator. Of the filtered signal only
+    the samples after the last confirmed tone boundary are kept and
+    prepended to the next block, so a digit straddling two blocks is
+    decoded once it is complete. Memory is bounded by the block size plus
+    max_pending_duration (and history_duration when streaming), however
+    long the input is.
+
+    Parameters:
+    - sample_rate: int, rate of the raw samples.
+    - silence_threshold: float, absolute threshold on the front-end output,
+      or None to track it from the input seen so far (streaming).
+    - adaptive: bool, threshold the RMS envelope instead of the magnitude.
+    """
+
+    def __init__(self, sample_rate, silence_threshold=None, adaptive=False, threshold=0.02,
+                 min_silence_duration=0.1, min_tone_duration=0.05, max_pending_duration=10.0, history_duration=3.0):
+        self.frontend = BandpassDecimator(sample_rate)
+        self.sample_rate = self.frontend.output_rate
+        self.silence_threshold = silence_threshold
+        self.adaptive = adaptive
+        self.threshold = threshold
+        self.min_silence_duration = min_silence_duration
+        self.min_silence_samples = int(min_silence_duration * self.sample_rate)
+        self.min_tone_samples = int(min_tone_duration * self.sample_rate)
+        self.max_pending = int(max_pending_duration * self.sample_rate)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.history = np.zeros(0, dtype=np.float32)
+        self.history_samples = int(history_duration * self.sample_rate)
+        self.tone_level = 0.0
 
-        # Compute FFT for the tone segment
-        fft_data = np.abs(np.fft.rfft(tone_segment))
-        freqs = np.fft.rfftfreq(len(tone_segment), d=1/sample_rate)
+    # Silence threshold tracked from the input so far, for when it is not known up front
+    def running_threshold(self, filtered):
+        """
+        Percentiles are taken over the last history_duration of front-end
+        output. The tone level is the largest 99th percentile seen so far, so
+        clicks shorter than 1% of the history do not raise it. In adaptive
+        mode the noise floor is the current 10th percentile, capped so that a
+        stretch of continuous tone cannot push the threshold over it.
+        """
+        self.history = np.concatenate((self.history, filtered))[-self.history_samples:]
+        if not len(self.history):
+            return 0.0
 
-        # Detect peaks
-        peaks, _ = find_peaks(fft_data, height=0.50 * np.max(fft_data))
-        detected_freqs = freqs[peaks]
+        envelope = rms_envelope(self.history, self.sample_rate) if self.adaptive else np.abs(self.history)
+        noise_floor, tone_level = np.percentile(envelope, [10, 99])
+        self.tone_level = max(self.tone_level, float(tone_level))
 
-        # Match frequencies to DTMF tones
-        for digit, (f1, f2) in dtmf_freqs.items():
-            if (np.any(np.isclose(detected_freqs, f1, atol=10)) and
-                    np.any(np.isclose(detected_freqs, f2, atol=10))):
-                detected_digits.append(digit)
-                break
+        silence_threshold = self.threshold * self.tone_level
+        if self.adaptive:
+            silence_threshold = max(min(2.0 * noise_floor, 0.5 * self.tone_level), silence_threshold)
+        return silence_threshold
 
+    def feed(self, block):
+        """Process one block of raw samples and return the digits completed in it."""
+        filtered = self.frontend.process(block)
+        data = np.concatenate((self.pending, filtered))
+        silence_threshold = self.silence_threshold
+        if silence_threshold is None:
+            silence_threshold = self.running_threshold(filtered)
+        silent_regions = detect_silent_regions(data, self.sample_rate, min_silence_duration=self.min_silence_duration,
+                                               adaptive=self.adaptive, silence_threshold=silence_threshold)
+
+        # A tone is complete once the silence after it is long enough. Keep
+        # everything from the last boundary on: the open tone, or the
+        # trailing silence that may still grow into the next block (of
+        # which min_silence_duration is enough to recognise it again).
+        if silent_regions and silent_regions[-1][1] == len(data):
+            keep_from = max(silent_regions[-1][0], len(data) - self.min_silence_samples)
+        else:
+            keep_from = silent_regions[-1][1] if silent_regions else 0
+        self.pending = data[keep_from:][-self.max_pending:]
+
+        segments = tone_segments(silent_regions, self.min_tone_samples)
+        return decode_tones(data, self.sample_rate, segments)
+
+# First pass over a long recording: the silence threshold, one block at a time
+def scan_silence_threshold(data, sample_rate, block_size, threshold=0.02, adaptive=False, noise_factor=2.0):
+    """
+    Compute the absolute silence threshold decode_signal would use, without
+    holding more than one block. In adaptive mode the percentiles are taken
+    per block and combined (median noise floor, loudest tone level).
+    """
+    decimator = BandpassDecimator(sample_rate)
+    peak = 0.0
+    noise_floors, tone_levels = [], []
+    for start in range(0, len(data), block_size):
+        block = decimator.process(data[start:start + block_size])
+        if adaptive:
+            noise_floor, tone_level = np.percentile(rms_envelope(block, decimator.output_rate), [10, 99])
+            noise_floors.append(noise_floor)
+            tone_levels.append(tone_level)
+        elif len(block):
+            peak = max(peak, float(np.max(np.abs(block))))
+
+    if adaptive:
+        return max(noise_factor * np.median(noise_floors), threshold * max(tone_levels)) if tone_levels else 0
+    return threshold * peak
+
+# Decode a WAV file block by block from a memory map
+def decode_dtmf_blocks(filename, block_duration=10.0, adaptive=False):
+    """
+    Decode a WAV file with memory bounded by block_duration rather than by the
+    file length. The file is memory mapped and read twice: once for the
+    silence threshold, once to decode.
+    """
+    sample_rate, data = read(filename, mmap=True)
+
+    # Use only one channel if stereo
+    if data.ndim > 1:
+        data = data[:, 0]
+
+    block_size = max(1, int(block_duration * sample_rate))
+    silence_threshold = scan_silence_threshold(data, sample_rate, block_size, adaptive=adaptive)
+    decoder = BlockDecoder(sample_rate, silence_threshold, adaptive)
+
+    detected_digits = []
+    for start in range(0, len(data), block_size):
+        detected_digits.extend(decoder.feed(data[start:start + block_size]))
     return detected_digits
 
+# Find runs of True along each row of a 2-D mask lasting at least min_length samples
+def find_runs_2d(mask, min_length):
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    keep = ends - starts >= min_length
+    return rows[keep], starts[keep], ends[keep]
+
+class MultiStreamDecoder:
+    """
+    Decode many audio streams at once.
+
+    Blocks are (n_streams, n_samples) arrays. Filtering, silence detection,
+    the Goertzel bank and classification each run as one vectorized pass
+    over all streams; only the handful of decoded digits is grouped per
+    stream in Python. Boundary handling follows BlockDecoder: a shared
+    pending buffer holds the samples after the earliest open boundary, and
+    each stream remembers where its own open boundary lies within it.
+
+    Parameters:
+    - n_streams: int, number of streams fed in every block.
+    - sample_rate: int, rate of the raw samples (the same for all streams).
+    - silence_threshold: float or array of n_streams, absolute thresholds on
+      the front-end output, or None to track them per stream.
+    """
+
+    def __init__(self, n_streams, sample_rate, silence_threshold=None, adaptive=False, threshold=0.02,
+                 min_silence_duration=0.1, min_tone_duration=0.05, max_pending_duration=10.0, history_duration=3.0):
+        self.n_streams = n_streams
+        self.frontend = BandpassDecimator(sample_rate)
+        self.sample_rate = self.frontend.output_rate
+        if silence_threshold is not None:
+            silence_threshold = np.broadcast_to(np.asarray(silence_threshold, dtype=np.float64), (n_streams,))
+        self.silence_threshold = silence_threshold
+        self.adaptive = adaptive
+        self.threshold = threshold
+        self.min_silence_samples = int(min_silence_duration * self.sample_rate)
+        self.min_tone_samples = int(min_tone_duration * self.sample_rate)
+        self.max_pending = int(max_pending_duration * self.sample_rate)
+        self.pending = np.zeros((n_streams, 0), dtype=np.float32)
+        self.boundaries = np.zeros(n_streams, dtype=np.int64)
+        self.history = np.zeros((n_streams, 0), dtype=np.float32)
+        self.history_samples = int(history_duration * self.sample_rate)
+        self.tone_level = np.zeros(n_streams)
+
+    # Per-stream version of BlockDecoder.running_threshold
+    def running_threshold(self, filtered):
+        self.history = np.concatenate((self.history, filtered), axis=1)[:, -self.history_samples:]
+        if not self.history.shape[1]:
+            return np.zeros(self.n_streams)
+
+        envelope = rms_envelope(self.history, self.sample_rate) if self.adaptive else np.abs(self.history)
+        noise_floor, tone_level = np.percentile(envelope, [10, 99], axis=1)
+        self.tone_level = np.maximum(self.tone_level, tone_level)
+
+        silence_threshold = self.threshold * self.tone_level
+        if self.adaptive:
+            silence_threshold = np.maximum(np.minimum(2.0 * noise_floor, 0.5 * self.tone_level), silence_threshold)
+        return silence_threshold
+
+    def feed(self, block):
+        """Process one (n_streams, n_samples) block; return the completed digits of each stream."""
+        filtered = self.frontend.process(np.atleast_2d(block))
+        silence_threshold = self.silence_threshold
+        if silence_threshold is None:
+            silence_threshold = self.running_threshold(filtered)
+        return self.decode_filtered(np.concatenate((self.pending, filtered), axis=1), silence_threshold)
+
+    def decode_filtered(self, data, silence_threshold):
+        length = data.shape[1]
+        with profiling.stage("detect_silent_regions", data.size):
+            envelope = rms_envelope(data, self.sample_rate) if self.adaptive else np.abs(data)
+            rows, starts, ends = find_runs_2d(envelope < silence_threshold[:, None], self.min_silence_samples)
+
+        # Ignore silences that ended before a stream's open boundary
+        keep = ends > self.boundaries[rows]
+        rows, starts, ends = rows[keep], starts[keep], ends[keep]
+
+        # Each tone runs from the previous silence of its stream (or the open
+        # boundary, for the first one) to the next silence
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        tone_starts = np.where(first, self.boundaries[rows], np.roll(ends, 1))
+        is_tone = starts - tone_starts >= self.min_tone_samples
+        profiling.count("segments_found", int(np.sum(is_tone)))
+        profiling.count("segments_too_short", int(np.sum(~is_tone & (starts > tone_starts))))
+
+        # New open boundary per stream, as in BlockDecoder.feed
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = rows[1:] != rows[:-1]
+        boundaries = self.boundaries.copy()
+        last_starts, last_ends = starts[last], ends[last]
+        boundaries[rows[last]] = np.where(last_ends == length,
+                                          np.maximum(last_starts, length - self.min_silence_samples), last_ends)
+
+        detected_digits = [[] for _ in range(self.n_streams)]
+        if np.any(is_tone):
+            tone_rows = rows[is_tone]
+            segments = np.stack((tone_starts[is_tone], starts[is_tone]), axis=1)
+
+            # One Goertzel pass over every stream, pooled per tone through a cumulative sum
+            with profiling.stage("goertzel", data.size):
+                energies, frame_length, hop = goertzel_energies(data, self.sample_rate)
+                cumulative = np.zeros((self.n_streams, energies.shape[1] + 1, energies.shape[2]))
+                np.cumsum(energies, axis=1, out=cumulative[:, 1:])
+                first_frame = np.clip(-(-segments[:, 0] // hop), 0, energies.shape[1])
+                last_frame = np.clip((segments[:, 1] - frame_length) // hop + 1, first_frame, energies.shape[1])
+            with profiling.stage("classify_tones", len(segments)):
+                codes = classify_tones(cumulative[tone_rows, last_frame] - cumulative[tone_rows, first_frame])
+            profiling.count("segments_unmatched", int(np.sum(codes < 0)))
+            profiling.count("digits_decoded", int(np.sum(codes >= 0)))
+
+            for row, code in zip(tone_rows.tolist(), codes.tolist()):
+                if code >= 0:
+                    detected_digits[row].append(dtmf_keypad[code])
+
+        # Keep the samples after the earliest open boundary, within max_pending
+        cut = max(min(int(boundaries.min()), length), length - self.max_pending)
+        self.pending = data[:, cut:]
+        self.boundaries = np.maximum(boundaries - cut, 0)
+        return detected_digits
+
+# Decode N equally long streams given as one (n_streams, n_samples) array
+def decode_streams(data, sample_rate, adaptive=False, threshold=0.02, min_silence_duration=0.1, min_tone_duration=0.05):
+    """
+    Batch counterpart of decode_signal for many streams: every stream gets
+    its own silence threshold, computed exactly as decode_signal would.
+
+    Returns:
+    - list: one list of digits per stream.
+    """
+    data = np.atleast_2d(data)
+    decoder = MultiStreamDecoder(data.shape[0], sample_rate, adaptive=adaptive, threshold=threshold,
+                                 min_silence_duration=min_silence_duration, min_tone_duration=min_tone_duration)
+    filtered = decoder.frontend.process(data)
+    if not filtered.shape[1]:
+        return [[] for _ in range(data.shape[0])]
+
+    if adaptive:
+        noise_floor, tone_level = np.percentile(rms_envelope(filtered, decoder.sample_rate), [10, 99], axis=1)
+        silence_threshold = np.maximum(2.0 * noise_floor, threshold * tone_level)
+    else:
+        silence_threshold = threshold * np.max(np.abs(filtered), axis=1)
+    return decoder.decode_filtered(filtered, silence_threshold)
+
+# Sample formats accepted on stdin, named as in arecord -f
+pcm_formats = {
+    'S16_LE': np.dtype('<i2'), 'S32_LE': np.dtype('<i4'),
+    'FLOAT_LE': np.dtype('<f4'), 'U8': np.dtype('u1'),
+}
+
+# Decode raw interleaved PCM from a byte stream, yielding digits as their tones end
+def decode_stream(stream, sample_rate, sample_format='S16_LE', channels=1, block_frames=1024, adaptive=False):
+    """
+    Decode a raw PCM stream (e.g. arecord piped to stdin) incrementally.
+
+    Memory is constant: each read is at most block_frames frames and the
+    decoder keeps only filter state and the samples since the last tone
+    boundary. Only the first channel is decoded.
+    """
+    dtype = pcm_formats[sample_format]
+    frame_bytes = dtype.itemsize * channels
+    read = getattr(stream, 'read1', stream.read)
+    decoder = BlockDecoder(sample_rate, adaptive=adaptive)
+    leftover = b''
+
+    while True:
+        chunk = read(block_frames * frame_bytes)
+        if not chunk:
+            break
+        chunk = leftover + chunk
+        usable = len(chunk) - len(chunk) % frame_bytes
+        leftover = chunk[usable:]
+
+        samples = np.frombuffer(chunk[:usable], dtype=dtype).reshape(-1, channels)[:, 0]
+        if dtype == np.uint8:
+            samples = samples.astype(np.int16) - 128
+        yield from decoder.feed(samples)
+
+# Spectrogram at display resolution: one column per pixel, however long the signal
+def display_spectrogram(data, sample_rate, columns=2000, nfft=256, batch_samples=1 << 22):
+    """
+    Power spectrum of data in at most columns time columns.
+
+    Each column is the per-bin maximum over FFT frames laid end to end
+    across its span (one frame when the span is shorter than nfft), so a
+    short tone stays visible however much time a column covers. Columns
+    are computed a batch at a time, which keeps memory near batch_samples
+    whatever the length of data.
+
+    Returns:
+    - np.ndarray: power with shape (nfft // 2 + 1, n_columns).
+    - float: seconds per column.
+    """
+    if len(data) < nfft:
+        data = np.pad(data, (0, nfft - len(data)))
+    # Columns much narrower than a frame would only repeat each other
+    columns = max(1, min(columns, len(data) // (nfft // 4)))
+    span = len(data) / columns
+    frames_per_column = max(1, int(span // nfft))
+    offsets = np.arange(frames_per_column) * (span / frames_per_column)
+    window = np.hanning(nfft).astype(np.float32)
+    batch = max(1, batch_samples // (frames_per_column * nfft))
+
+    power = np.empty((columns, nfft // 2 + 1), dtype=np.float32)
+    with profiling.stage("spectrogram", len(data)):
+        for first in range(0, columns, batch):
+            column = np.arange(first, min(first + batch, columns))
+            starts = np.minimum(column[:, None] * span + offsets, len(data) - nfft).astype(np.int64)
+            spectra = np.fft.rfft(data[starts[..., None] + np.arange(nfft)] * window, axis=-1)
+            power[column] = np.max(np.square(np.abs(spectra)), axis=1)
+    return power.T, span / sample_rate
+
+# Plot a spectrogram of front-end output with the tones found in it
+def plot_annotations(data, sample_rate, annotations, title="", output=None, max_labels=200):
+    """
+    Show (or save to output) the DTMF band of data with a bar under each
+    tone and its symbol above it. Symbols are drawn only while at most
+    max_labels tones are in view, and redrawn on zooming or panning.
+    """
+    # Imported here so that decoding without a plot never loads matplotlib
+    import matplotlib.pyplot as plt
+
+    power, column_duration = display_spectrogram(data, sample_rate)
+    level = 10 * np.log10(power + np.finfo(np.float32).tiny)
+    top = level.max()
+
+    fig, ax = plt.subplots(figsize=(14, 5))
+    ax.imshow(level, origin='lower', aspect='auto', interpolation='nearest', cmap='magma', vmin=top - 80, vmax=top,
+              extent=(0, power.shape[1] * column_duration, 0, sample_rate / 2))
+    ax.set_ylim(passband[0] - 150, passband[1] + 150)
+    ax.set_yticks(row_freqs + col_freqs)
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Frequency (Hz)")
+    ax.set_title(f"{title}  {len(annotations)} tones, {sum(a[2] == '?' for a in annotations)} unmatched")
+
+    # Outlines keep back-to-back gapless tones apart, but would blacken a long recording
+    bar_y, label_y = passband[0] - 120, passband[1] + 90
+    outline = 0.5 if len(annotations) <= 10 * max_labels else 0
+    for unmatched, color in ((False, 'tab:green'), (True, 'tab:red')):
+        ax.broken_barh([(start, end - start) for start, end, symbol in annotations if (symbol == '?') == unmatched],
+                       (bar_y, 60), facecolors=color, edgecolors='black', linewidths=outline)
+
+    centres = np.array([(start + end) / 2 for start, end, _ in annotations])
+    labels = []
+
+    def relabel(ax):
+        for text in labels:
+            text.remove()
+        labels.clear()
+        left, right = ax.get_xlim()
+        visible = np.flatnonzero((centres >= left) & (centres <= right))
+        if len(visible) <= max_labels:
+            for i in visible.tolist():
+                labels.append(ax.text(centres[i], label_y, annotations[i][2], ha='center', va='center',
+                                      color='white', clip_on=True))
+
+    relabel(ax)
+    ax.callbacks.connect('xlim_changed', relabel)
+    fig.tight_layout()
+    if output:
+        fig.savefig(output)
+    else:
+        plt.show()
+
+# Decode a WAV file and plot it with the tones found, returning the digits
+def visualize_dtmf(filename, adaptive=False, timing=None, output=None):
+    # Memory mapped: long recordings are read through once, by the front-end
+    sample_rate, data = read(filename, mmap=True)
+
+    # Use only one channel if stereo
+    if data.ndim > 1:
+        data = data[:, 0]
+
+    annotations, filtered, rate = tone_annotations(data, sample_rate, timing, adaptive)
+    plot_annotations(filtered, rate, annotations, title=filename, output=output)
+    return list(remove_repeats("".join(symbol for _, _, symbol in annotations if symbol != '?')))
+
+def decode_dtmf(filename, visualize=False, adaptive=False, block_duration=None, timing=None, plot_file=None):
+    if visualize or plot_file:
+        return visualize_dtmf(filename, adaptive, timing, plot_file)
+    if block_duration:
+        return decode_dtmf_blocks(filename, block_duration, adaptive)
+
+    # Read the audio file
+    sample_rate, data = read(filename)
+
+    # Use only one channel if stereo
+    if data.ndim > 1:
+        data = data[:, 0]
+
+    if timing is not None:
+        return decode_profile(data, sample_rate, timing, adaptive)
+    return decode_signal(data, sample_rate, adaptive)
+
 def print_usage():
-    print(f"Usage: {sys.argv[0]} [-viz] filename")
+    print(f"Usage: {sys.argv[0]} [--profile] [-viz | -plot PNG] [-adaptive] [-block SECONDS] [-timing PROFILE_OR_SECONDS] filename")
+    print("-viz shows a spectrogram with the tones found; -plot saves it instead")
     print(f"Example: {sys.argv[0]} -viz 123.wav")
+    print(f"Example: {sys.argv[0]} -timing telephony dtmf.wav")
+    print(f"Example: {sys.argv[0]} -block 10 long_capture.wav")
+    print(f"       {sys.argv[0]} -stream [-adaptive] [-rate HZ] [-format S16_LE|S32_LE|FLOAT_LE|U8] [-channels N]")
+    print(f"Example: arecord -t raw -f S16_LE -r 44100 | {sys.argv[0]} -stream -rate 44100")
+
+# Remove "name value" from argv and return value, or default when absent
+def pop_option(name, default):
+    if name in sys.argv[:-1]:
+        i = sys.argv.index(name)
+        value = sys.argv[i + 1]
+        del sys.argv[i:i + 2]
+        return value
+    return default
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    profiling.from_argv(sys.argv)
+    if "-stream" in sys.argv:
+        sys.argv.remove("-stream")
+        adaptive = "-adaptive" in sys.argv
+        if adaptive:
+            sys.argv.remove("-adaptive")
+        sample_rate = int(pop_option("-rate", 44100))
+        sample_format = pop_option("-format", "S16_LE")
+        channels = int(pop_option("-channels", 1))
+        try:
+            for digit in decode_stream(sys.stdin.buffer, sample_rate, sample_format, channels, adaptive=adaptive):
+                sys.stdout.write(digit)
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+        print()
+    elif len(sys.argv) < 2:
         print_usage()
     else:
         visualize = False
@@ -111,12 +930,23 @@ if __name__ == "__main__":
             visualize = True
             sys.argv.remove("-viz")
 
+        adaptive = False
+        if "-adaptive" in sys.argv:
+            adaptive = True
+            sys.argv.remove("-adaptive")
+
+        block_duration = pop_option("-block", None)
+        if block_duration is not None:
+            block_duration = float(block_duration)
+        timing = pop_option("-timing", None)
+        plot_file = pop_option("-plot", None)
+
         if len(sys.argv) < 2:
             print_usage()
         else:
             filename = sys.argv[1]
             try:
-                decoded_digits = decode_dtmf(filename, visualize)
+                decoded_digits = decode_dtmf(filename, visualize, adaptive, block_duration, timing, plot_file)
                 #print("Detected DTMF Tones:", "".join(decoded_digits))
                 print("".join(decoded_digits))
             except Exception as e:
@@ -1,6 +1,8 @@
 import sys
+from functools import lru_cache
 import numpy as np
 from scipy.io.wavfile import write
+import profiling
 
 # Define DTMF frequencies
 dtmf_freqs = {
@@ -10,8 +12,102 @@ dtmf_freqs = {
     '*': (941, 1209), '0': (941, 1336), '#': (941, 1477), 'D': (941, 1633)
 }
 
+# Sent in gapless mode in place of a digit equal to the one before it, since
+# two identical tones with no gap between them would merge into one. It is a
+# dual-row pair, which no DTMF digit uses.
+repeat_symbol = 'R'
+repeat_freqs = (697, 852)
+
+# Symbol timings in seconds: tone length, silence after each tone, and the
+# raised-cosine ramp at both ends of a tone. A gap of 0 means gapless mode.
+profiles = {
+    'slow':      {'tone': 1.0, 'gap': 1.0, 'ramp': 0.0},     # DTMFencode.py's default pulse_length
+    'classic':   {'tone': 0.1, 'gap': 0.1, 'ramp': 0.0},     # What otp_encode.sh used to send
+    'fast':      {'tone': 0.05, 'gap': 0.05, 'ramp': 0.005},
+    'telephony': {'tone': 0.04, 'gap': 0.04, 'ramp': 0.004}, # Standard telephony digit timing
+    'gapless':   {'tone': 0.04, 'gap': 0.0, 'ramp': 0.002},
+}
+
+# Look up a profile by name, or treat a number as equal tone and gap lengths with hard edges
+def profile_of(timing):
+    if timing in profiles:
+        return profiles[timing]
+    try:
+        length = float(timing)
+    except ValueError:
+        raise ValueError(f"Unknown timing profile '{timing}'; choose from {', '.join(profiles)} or give seconds")
+    return {'tone': length, 'gap': length, 'ramp': 0.0}
+
+# Order of the rows in symbol_table
+symbols = "".join(dtmf_freqs) + repeat_symbol
+symbol_freqs = {**dtmf_freqs, repeat_symbol: repeat_freqs}
+
+# Row of each byte value in symbol_table, or -1 for characters that are not DTMF digits
+symbol_index = np.full(256, -1, dtype=np.int64)
+for i, digit in enumerate(symbols):
+    symbol_index[ord(digit)] = i
+
+# Function to fade each row of tones in and out over ramp seconds with a raised cosine, in place
+def apply_ramp(tones, ramp, sample_rate):
+    ramp_length = min(int(sample_rate * ramp), tones.shape[-1] // 2)
+    if ramp_length:
+        edge = 0.5 - 0.5 * np.cos(np.pi * (np.arange(ramp_length) + 0.5) / ramp_length)
+        tones[..., :ramp_length] *= edge
+        tones[..., tones.shape[-1] - ramp_length:] *= edge[::-1]
+    return tones
+
+# Cache one int16 waveform per symbol: the tone followed by its gap
+@lru_cache(maxsize=None)
+def symbol_table(duration, gap, sample_rate, ramp=0.0):
+    """
+    Waveforms of every DTMF symbol, built once per timing.
+
+    All symbols share one normalization (the loudest symbol's peak), so any
+    message built from the table peaks just under 16-bit full scale. A
+    non-zero ramp fades each tone in and out with a raised cosine, which
+    keeps the spectrum of short tones from splattering into other bins.
+
+    Returns:
+    - np.ndarray: (len(symbols), tone + gap samples) int16 array, read-only.
+    """
+    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
+    freqs = np.array([symbol_freqs[digit] for digit in symbols], dtype=np.float64)
+    tones = np.sin(2 * np.pi * freqs[:, 0, None] * t) + np.sin(2 * np.pi * freqs[:, 1, None] * t)
+
+    apply_ramp(tones, ramp, sample_rate)
+
+    table = np.zeros((len(symbols), len(t) + int(sample_rate * gap)), dtype=np.int16)
+    table[:, :len(t)] = tones / np.max(np.abs(tones)) * 32767
+    table.flags.writeable = False
+    return table
+
+# Rows of symbol_table for a string of digits, skipping invalid characters
+def digit_indices(digits):
+    indices = symbol_index[np.frombuffer(digits.encode('latin-1', 'replace'), dtype=np.uint8)]
+    return indices[indices >= 0]
+
+# Function to replace each digit equal to the symbol before it with repeat_symbol, for gapless mode
+def insert_repeats(digits):
+    sent = []
+    for digit in digits:
+        if digit not in dtmf_freqs:
+            continue  # Skip invalid characters, so they cannot hide a repeat
+        sent.append(repeat_symbol if sent and sent[-1] == digit else digit)
+    return "".join(sent)
+
+# Function to undo insert_repeats
+def remove_repeats(symbols):
+    digits = []
+    for symbol in symbols:
+        if symbol == repeat_symbol:
+            if digits:
+                digits.append(digits[-1])
+        else:
+            digits.append(symbol)
+    return "".join(digits)
+
 # Generate DTMF tone
-def generate_dtmf_tone(digits, duration=1.0, sample_rate=44100):
+def generate_dtmf_tone(digits, duration=1.0, sample_rate=44100, gap=None, ramp=0.0):
     """
     Generate DTMF tones for a given string of digits.
 
@@ -19,48 +115,118 @@ def generate_dtmf_tone(digits, duration=1.0, sample_rate=44100):
     - digits: str, string of digits (0-9, *, #).
     - duration: float, duration of each tone in seconds.
     - sample_rate: int, sampling rate in Hz.
+    - gap: float, silence after each tone in seconds (default: duration).
+    - ramp: float, raised-cosine fade at both ends of each tone in seconds.
 
     Returns:
     - np.ndarray: The combined DTMF signal as a numpy array.
     """
-    signal = np.array([])
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
+    with profiling.stage("generate_dtmf_tone") as stage:
+        table = symbol_table(duration, duration if gap is None else gap, sample_rate, ramp)
+        indices = digit_indices(digits)
 
-    for digit in digits:
-        if digit not in dtmf_freqs:
-            continue  # Skip invalid characters
-        f1, f2 = dtmf_freqs[digit]
-        tone = np.sin(2 * np.pi * f1 * t) + np.sin(2 * np.pi * f2 * t)
-        signal = np.concatenate((signal, tone))
-        silence = np.zeros(int(sample_rate * duration))  # Add 10% silence between tones
-        signal = np.concatenate((signal, silence))
+        # One gather into an output buffer sized up front
+        signal = np.empty((len(indices), table.shape[1]), dtype=np.int16)
+        np.take(table, indices, axis=0, out=signal)
+
+        stage.samples = signal.size
+        return signal.reshape(-1)
+
+# Generate DTMF tones block by block, so output can start before the whole message is built
+def generate_dtmf_blocks(digits, duration=1.0, sample_rate=44100, gap=None, ramp=0.0, block_symbols=1):
+    """
+    Yield the signal of generate_dtmf_tone in pieces of block_symbols symbols.
 
-    return np.int16(signal / np.max(np.abs(signal)) * 32767)  # Normalize to 16-bit PCM
+    Each block is built from symbol_table when it is requested, so memory
+    stays at one block however long the message is.
+
+    Returns:
+    - generator of np.ndarray: int16 blocks; concatenated, they equal generate_dtmf_tone.
+    """
+    table = symbol_table(duration, duration if gap is None else gap, sample_rate, ramp)
+    indices = digit_indices(digits)
+    for start in range(0, len(indices), block_symbols):
+        yield np.take(table, indices[start:start + block_symbols], axis=0).reshape(-1)
+
+# Generate DTMF tones with a timing profile
+def generate_profile(digits, timing, sample_rate=44100, blocks=False):
+    """
+    Generate DTMF tones for digits using a timing profile.
+
+    Parameters:
+    - timing: str or float, a name in profiles, or seconds for equal tone
+      and gap lengths (the old pulse_length).
+    - blocks: bool, yield the signal symbol by symbol (see generate_dtmf_blocks).
+
+    Returns:
+    - np.ndarray, or a generator of blocks when blocks is set.
+    """
+    profile = profile_of(timing)
+    if not profile['gap']:
+        digits = insert_repeats(digits)
+    generate = generate_dtmf_blocks if blocks else generate_dtmf_tone
+    return generate(digits, profile['tone'], sample_rate, gap=profile['gap'], ramp=profile['ramp'])
+
+# Play int16 PCM blocks on the default output device as they arrive
+def play_pcm(blocks, sample_rate=44100):
+    import sounddevice as sd  # Only needed for playback
+    with sd.OutputStream(samplerate=sample_rate, channels=1, dtype='int16') as stream:
+        for block in blocks:
+            stream.write(block)  # Blocks while the device buffer is full
+
+# Write int16 PCM blocks to a byte stream as raw 16-bit little-endian mono PCM as they arrive
+def write_pcm(stream, blocks):
+    for block in blocks:
+        stream.write(block.astype('<i2').tobytes())
+        stream.flush()
+
+# Play DTMF tones on the default output device as they are generated
+def play_dtmf(digits, timing=1.0, sample_rate=44100):
+    play_pcm(generate_profile(digits, timing, sample_rate, blocks=True), sample_rate)
+
+# Write DTMF tones to a byte stream as raw PCM, one symbol at a time
+def write_dtmf_pcm(stream, digits, timing=1.0, sample_rate=44100):
+    write_pcm(stream, generate_profile(digits, timing, sample_rate, blocks=True))
 
 # Save DTMF tones to a WAV file
-def save_to_wav(filename, digits, duration):
+def save_to_wav(filename, digits, timing):
     """
     Generate and save DTMF tones to a WAV file.
 
     Parameters:
     - filename: str, name of the WAV file to save.
     - digits: str, string of digits to convert to DTMF tones.
-    - duration: float, duration of each tone in seconds.
+    - timing: str or float, a profile name or the duration of each tone and gap in seconds.
     """
     sample_rate = 44100
-    dtmf_signal = generate_dtmf_tone(digits, duration=duration, sample_rate=sample_rate)
-    write(filename, sample_rate, dtmf_signal)  # Save as WAV
+    dtmf_signal = generate_profile(digits, timing, sample_rate)
+    with profiling.stage("write_wav", len(dtmf_signal)):
+        write(filename, sample_rate, dtmf_signal)  # Save as WAV
     print(f"DTMF tones saved to {filename}")
 
 def print_usage():
-    print(f"Usage: {sys.argv[0]} DIGITS filename [pulse_length]")
+    print(f"Usage: {sys.argv[0]} [--profile] DIGITS filename [pulse_length | timing_profile]")
+    print(f"       {sys.argv[0]} -play DIGITS [pulse_length | timing_profile]")
+    print(f"       {sys.argv[0]} -raw DIGITS [pulse_length | timing_profile] > dtmf.pcm")
+    print("-play plays the tones as they are generated; -raw writes 16-bit 44100 Hz mono PCM to stdout")
+    print(f"Timing profiles: {', '.join(profiles)}")
     print("Example: ", sys.argv[0], "123 123.wav 0.5")
+    print("Example: ", sys.argv[0], "123 123.wav telephony")
+    print("Example: ", sys.argv[0], "-raw 123 0.1 | aplay -f S16_LE -r 44100")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
+    profiling.from_argv(sys.argv)
+    if len(sys.argv) >= 3 and sys.argv[1] in ("-play", "-raw"):
+        digits = sys.argv[2]
+        timing = sys.argv[3] if len(sys.argv) > 3 else 1.0
+        if sys.argv[1] == "-play":
+            play_dtmf(digits, timing)
+        else:
+            write_dtmf_pcm(sys.stdout.buffer, digits, timing)
+    elif len(sys.argv) < 3:
         print_usage()
     else:
         digits = sys.argv[1]
         filename = sys.argv[2]
-        pulse_length = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0  # Default duration is 1 second
-        save_to_wav(filename, digits, pulse_length)
+        timing = sys.argv[3] if len(sys.argv) > 3 else 1.0  # Default duration is 1 second
+        save_to_wav(filename, digits, timing)
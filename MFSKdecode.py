@@ -0,0 +1,127 @@
+import sys
+import numpy as np
+from scipy.io.wavfile import read
+import profiling
+from DTMFdecode import frontend, find_runs, goertzel_energies, rms_envelope
+from MFSKencode import tone_freqs, marker_pair, byte_pairs, symbol_duration, gap_duration, marker_duration, ramp_duration
+
+# Byte value of each (lower, higher) tone pair, -1 for pairs that carry no byte
+pair_bytes = np.full((len(tone_freqs), len(tone_freqs)), -1, dtype=np.int64)
+pair_bytes[byte_pairs[:, 0], byte_pairs[:, 1]] = np.arange(len(byte_pairs))
+
+# Find the mode marker in front-end output and return the sample where its tone ends, or None
+def find_marker(data, sample_rate, min_ratio=2.0):
+    """
+    Locate the first MFSK mode marker.
+
+    The marker is found coarsely with a Goertzel bank over sliding frames
+    (both marker tones beating every other tone by min_ratio), then its
+    start is pinned down to a few samples with the RMS envelope. The onset
+    is used rather than the end because echoes smear the end into the
+    symbols that follow, while the direct sound always arrives first.
+    """
+    frame_duration = symbol_duration / 2
+    energies, frame_length, hop = goertzel_energies(data, sample_rate, tone_freqs, frame_duration)
+    if not len(energies):
+        return None
+    marker = np.min(energies[:, list(marker_pair)], axis=1)
+    others = np.max(np.delete(energies, list(marker_pair), axis=1), axis=1)
+    runs = find_runs((marker >= min_ratio * others) & (marker > 0), 2)
+    if not runs:
+        return None
+
+    # The two marker tones beat at their difference frequency; an RMS window of
+    # one beat period gives a flat envelope over the marker
+    first_frame, last_frame = runs[0]
+    middle = ((first_frame + last_frame) // 2) * hop + frame_length // 2
+    beat = 1 / abs(tone_freqs[marker_pair[1]] - tone_freqs[marker_pair[0]])
+    envelope = rms_envelope(data, sample_rate, beat)
+    level = np.median(envelope[first_frame * hop:(last_frame - 1) * hop + frame_length])
+    below = np.flatnonzero(envelope[:middle] < 0.5 * level)
+    crossing = below[-1] + 1 if len(below) else 0
+    # Half the RMS is a quarter of the energy: the centred window is then a
+    # quarter window short of the onset, plus half the opening ramp
+    start = crossing + int((beat / 4 - ramp_duration / 2) * sample_rate)
+    return start + int(round(marker_duration * sample_rate))
+
+# Function to tell the modulation of a recording from the presence of the MFSK marker
+def detect_mode(data, sample_rate):
+    filtered, rate = frontend(data, sample_rate)
+    return "mfsk" if find_marker(filtered, rate) is not None else "dtmf"
+
+def decode_mfsk(data, sample_rate, duration=symbol_duration, gap=gap_duration, gate=0.05, echo=0.25):
+    """
+    Demodulate an MFSK transmission made by MFSKencode.generate_mfsk.
+
+    Symbols sit in fixed slots after the marker. Each one is matched against
+    all 24 tones over the middle half of its slot: 25 ms, one period of the
+    tone spacing, so neighbouring tones do not leak into each other, with
+    12.5 ms of slack either side for echoes and clock drift. The two
+    strongest tones give the byte, after taking echo times the previous
+    slot's energies off each tone, since the reverberant tail of the last
+    symbol is still ringing.
+
+    The first two symbols give the payload length. Should they be corrupted,
+    decoding still stops at the first three slots in a row weaker than gate
+    times the marker, measured over a window of the same length, i.e. where
+    the transmission ended.
+
+    Returns:
+    - bytes: the payload (empty if no marker was found).
+    """
+    data, sample_rate = frontend(data, sample_rate)
+    marker_end = find_marker(data, sample_rate)
+    if marker_end is None:
+        return b''
+
+    slot_length = int(round((duration + gap) * sample_rate))
+    window = int(round(duration / 2 * sample_rate))
+    first = marker_end + int(round(gap * sample_rate)) + int(round(duration / 4 * sample_rate))
+    n_slots = max(0, (len(data) - first - window) // slot_length + 1)
+    if n_slots < 2:
+        return b''
+
+    # One Goertzel frame per slot, all slots in a single matrix product. The
+    # marker's middle goes in front as the level reference.
+    with profiling.stage("goertzel", (n_slots + 1) * window):
+        marker_start = max(0, marker_end - int(round((marker_duration + duration / 2) * sample_rate / 2)))
+        starts = np.concatenate(([marker_start], first + slot_length * np.arange(n_slots)))
+        windows = data[starts[:, None] + np.arange(window)]
+        energies = goertzel_energies(windows, sample_rate, tone_freqs, window / sample_rate)[0][:, 0, :]
+    marker_level, energies = np.sum(energies[0]), energies[1:]
+
+    # Echoes can notch out one symbol's tones, so only a run of weak slots ends the message
+    weak = np.sum(energies, axis=1) < gate * marker_level
+    ended = np.flatnonzero(weak[:len(weak) - 2] & weak[1:len(weak) - 1] & weak[2:])
+    energies = energies[:ended[0]] if len(ended) else energies[:len(energies) - np.argmin(weak[::-1])]
+
+    with profiling.stage("classify_tones", len(energies)):
+        scores = energies.copy()
+        scores[1:] -= echo * energies[:-1]
+        pairs = np.sort(np.argpartition(scores, -2, axis=1)[:, -2:], axis=1)
+        values = pair_bytes[pairs[:, 0], pairs[:, 1]]
+    profiling.count("symbols_invalid", int(np.sum(values < 0)))
+    # An invalid pair is a corrupted symbol; keep its slot so later bytes stay aligned
+    decoded = np.where(values < 0, 0, values).astype(np.uint8).tobytes()
+    length = int.from_bytes(decoded[:2], 'big')
+    return decoded[2:2 + length]
+
+def decode_mfsk_file(filename):
+    sample_rate, data = read(filename)
+    if data.ndim > 1:
+        data = data[:, 0]
+    return decode_mfsk(data, sample_rate)
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} [--profile] filename")
+    print(f"Example: {sys.argv[0]} mfsk.wav")
+
+if __name__ == "__main__":
+    profiling.from_argv(sys.argv)
+    if len(sys.argv) < 2:
+        print_usage()
+    else:
+        try:
+            print(decode_mfsk_file(sys.argv[1]).decode('utf-8', 'replace'))
+        except Exception as e:
+            print(f"Error decoding file: {e}")
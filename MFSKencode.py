@@ -0,0 +1,96 @@
+import sys
+from functools import lru_cache
+from itertools import combinations
+import numpy as np
+from scipy.io.wavfile import write
+import profiling
+from DTMFencode import apply_ramp
+
+# 24 tones 40 Hz apart inside the decoder's 650-1700 Hz band-pass. A symbol
+# sounds two of them at once; the 276 possible pairs cover every byte value
+# with 20 to spare, one of which marks the start of an MFSK transmission.
+tone_freqs = 700 + 40 * np.arange(24)
+marker_pair = (8, 10)  # 1020 + 1100 Hz; no DTMF digit uses either tone
+
+# The tone pair of each byte value: pairs in order, skipping the marker
+byte_pairs = np.array([pair for pair in combinations(range(len(tone_freqs)), 2) if pair != marker_pair][:256])
+
+# 50 ms tones are two periods of the 40 Hz spacing, so the tones stay orthogonal
+# over a symbol. The gap is a guard against echoes and clock drift. The marker
+# is longer than a symbol so it can be found reliably.
+symbol_duration = 0.05
+gap_duration = 0.01
+marker_duration = 0.1
+ramp_duration = 0.005
+
+# Function to synthesize tone pairs of the given length with raised-cosine edges, followed by a gap
+def tone_pairs(pairs, duration, gap, sample_rate, ramp=ramp_duration):
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    freqs = tone_freqs[np.asarray(pairs)]
+    tones = np.sin(2 * np.pi * freqs[:, 0, None] * t) + np.sin(2 * np.pi * freqs[:, 1, None] * t)
+
+    apply_ramp(tones, ramp, sample_rate)
+
+    table = np.zeros((len(freqs), len(t) + int(sample_rate * gap)), dtype=np.int16)
+    table[:, :len(t)] = tones / 2 * 32767
+    return table
+
+# Cache one int16 waveform per byte value (tone + gap) and one for the marker
+@lru_cache(maxsize=None)
+def symbol_table(duration, gap, sample_rate):
+    table = tone_pairs(byte_pairs, duration, gap, sample_rate)
+    marker = tone_pairs([marker_pair], marker_duration, gap, sample_rate)[0]
+    table.flags.writeable = False
+    marker.flags.writeable = False
+    return table, marker
+
+def generate_mfsk(data, duration=symbol_duration, gap=gap_duration, sample_rate=44100):
+    """
+    Modulate bytes as 2-of-24 MFSK, one byte per symbol, after a mode marker
+    and the payload length (2 bytes, big-endian), so the receiver knows
+    where the message ends however long the recording runs on.
+
+    Parameters:
+    - data: bytes, the payload.
+    - duration: float, tone length of each symbol in seconds.
+    - gap: float, silence after each symbol in seconds.
+    - sample_rate: int, sampling rate in Hz.
+
+    Returns:
+    - np.ndarray: int16 PCM.
+    """
+    if len(data) > 0xFFFF:
+        raise ValueError("Payload is too long for one MFSK transmission.")
+    with profiling.stage("generate_mfsk") as stage:
+        table, marker = symbol_table(duration, gap, sample_rate)
+        indices = np.frombuffer(len(data).to_bytes(2, 'big') + bytes(data), dtype=np.uint8)
+
+        signal = np.empty(len(marker) + len(indices) * table.shape[1], dtype=np.int16)
+        signal[:len(marker)] = marker
+        np.take(table, indices, axis=0, out=signal[len(marker):].reshape(len(indices), table.shape[1]))
+
+        stage.samples = len(signal)
+        return signal
+
+# Save an MFSK transmission to a WAV file
+def save_to_wav(filename, data, duration=symbol_duration, gap=gap_duration):
+    sample_rate = 44100
+    signal = generate_mfsk(data, duration, gap, sample_rate)
+    with profiling.stage("write_wav", len(signal)):
+        write(filename, sample_rate, signal)
+    print(f"MFSK symbols saved to {filename}")
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} [--profile] MESSAGE filename [symbol_duration] [gap_duration]")
+    print(f"Example: {sys.argv[0]} \"Merhaba\" mfsk.wav 0.05 0.01")
+
+if __name__ == "__main__":
+    profiling.from_argv(sys.argv)
+    if len(sys.argv) < 3:
+        print_usage()
+    else:
+        message = sys.argv[1].encode('utf-8')
+        filename = sys.argv[2]
+        duration = float(sys.argv[3]) if len(sys.argv) > 3 else symbol_duration
+        gap = float(sys.argv[4]) if len(sys.argv) > 4 else gap_duration
+        save_to_wav(filename, message, duration, gap)
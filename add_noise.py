@@ -2,7 +2,29 @@ import sys
 import numpy as np
 from scipy.io.wavfile import read, write
 
-def add_noise(input_file, output_file, noise_level_db=0.0):
+# Function to add white Gaussian noise in memory
+def awgn(data, noise_level_db, seed=None):
+    """
+    Add white Gaussian noise to one signal or to many at once.
+
+    Parameters:
+    - data: np.ndarray, samples along the last axis; leading axes are
+      independent trials.
+    - noise_level_db: float or np.ndarray, noise RMS relative to the signal
+      RMS in dB (the negative of the SNR). An array broadcasts against the
+      leading axes, e.g. one level per trial.
+    - seed: int or np.random.Generator, for reproducible noise.
+
+    Returns:
+    - np.ndarray: float64 noisy samples, same shape as data.
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float64)
+    signal_rms = np.sqrt(np.mean(np.square(data), axis=-1, keepdims=True))
+    noise_level = 10**(np.asarray(noise_level_db, dtype=np.float64)[..., None] / 20)
+    return data + rng.standard_normal(data.shape) * (signal_rms * noise_level)
+
+def add_noise(input_file, output_file, noise_level_db=0.0, seed=None):
     """
     Add noise to a WAV file and save the result.
 
@@ -10,6 +32,7 @@ def add_noise(input_file, output_file, noise_level_db=0.0):
     - input_file: str, path to the input WAV file.
     - output_file: str, path to save the output WAV file.
     - noise_level_db: float, noise level in decibels (default 0.0 dB).
+    - seed: int, seed for reproducible noise (default: fresh entropy).
     """
     # Read the input WAV file
     sample_rate, data = read(input_file)
@@ -19,7 +42,7 @@ def add_noise(input_file, output_file, noise_level_db=0.0):
         data = data[:, 0]
 
     # Calculate the RMS (Root Mean Square) of the signal
-    signal_rms = np.sqrt(np.mean(np.abs(np.square(data))))
+    signal_rms = np.sqrt(np.mean(np.abs(np.square(data.astype(np.float64)))))
     print("signal_rms: ",signal_rms)
 
     # Handle the case of silent audio (RMS is 0)
@@ -27,14 +50,7 @@ def add_noise(input_file, output_file, noise_level_db=0.0):
         print("Input audio is silent. No noise added.")
         noisy_data = data  # No noise to add, return the original data
     else:
-        # Convert dB to linear scale for the noise level
-        noise_level = 10**(noise_level_db / 20)
-
-        # Generate noise with the same RMS as the specified noise level
-        noise = np.random.normal(0, signal_rms * noise_level, data.shape)
-
-        # Add noise to the audio signal
-        noisy_data = data + noise
+        noisy_data = awgn(data, noise_level_db, seed=seed)
 
     # Clip to ensure values are within the range for int16
     noisy_data = np.clip(noisy_data, -32768, 32767).astype(np.int16)
@@ -44,14 +60,15 @@ def add_noise(input_file, output_file, noise_level_db=0.0):
     print(f"Noise added and saved to {output_file}")
 
 def print_usage():
-    print(f"Usage: {sys.argv[0]} input_file output_file [noise_level_db]")
+    print(f"Usage: {sys.argv[0]} input_file output_file [noise_level_db] [seed]")
     print(f"Example: {sys.argv[0]} input.wav output.wav 5")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3 or len(sys.argv) > 4:
+    if len(sys.argv) < 3 or len(sys.argv) > 5:
         print_usage()
     else:
         input_file = sys.argv[1]
         output_file = sys.argv[2]
-        noise_level_db = float(sys.argv[3]) if len(sys.argv) == 4 else 0.0
-        add_noise(input_file, output_file, noise_level_db)
+        noise_level_db = float(sys.argv[3]) if len(sys.argv) >= 4 else 0.0
+        seed = int(sys.argv[4]) if len(sys.argv) == 5 else None
+        add_noise(input_file, output_file, noise_level_db, seed)
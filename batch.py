@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from scipy.io.wavfile import write
+import DTMFdecode
+import DTMFencode
+from DTMFdecode import pop_option
+
+sample_rate = 44100
+
+# Runs once in every worker so the first job doesn't pay for imports and filter design
+def warm_up():
+    DTMFdecode.bandpass_sos(sample_rate)
+
+# Decode one WAV file sent with timing (None for the default segmentation); errors
+# are reported in the result instead of raised. Finding no digits counts as an
+# error, so a resumed run with the right timing tries the file again.
+def decode_job(filename, timing=None):
+    start = time.perf_counter()
+    try:
+        digits = "".join(DTMFdecode.decode_dtmf(filename, timing=timing))
+        error = None if digits else "No DTMF digits found"
+    except Exception as e:
+        digits, error = None, str(e)
+    return {"file": filename, "digits": digits, "seconds": time.perf_counter() - start, "error": error}
+
+# Encode one line of an encode manifest: DIGITS filename [timing]
+def encode_job(job):
+    digits, filename, timing = job
+    start = time.perf_counter()
+    try:
+        write(filename, sample_rate, DTMFencode.generate_profile(digits, timing, sample_rate))
+        error = None
+    except Exception as e:
+        error = str(e)
+    return {"file": filename, "digits": digits, "seconds": time.perf_counter() - start, "error": error}
+
+# Manifest lines name a timing profile or give a pulse length in seconds; 1.0 s if they don't
+default_timing = "1.0"
+
+# WAV files to decode: every *.wav in a directory, or one path per line of a manifest
+def decode_jobs(source):
+    if os.path.isdir(source):
+        return [os.path.join(source, name) for name in sorted(os.listdir(source)) if name.lower().endswith(".wav")]
+    with open(source) as f:
+        return [line.strip() for line in f if line.strip()]
+
+def encode_jobs(manifest):
+    jobs = []
+    with open(manifest) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 2:
+                jobs.append((fields[0], fields[1], fields[2] if len(fields) > 2 else default_timing))
+    return jobs
+
+# Files that already have an error-free result from an earlier run
+def finished_files(results_file):
+    finished = set()
+    if os.path.exists(results_file):
+        with open(results_file) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue  # Line cut short by an interrupted run
+                if result.get("error") is None:
+                    finished.add(result["file"])
+    return finished
+
+def run_batch(job_function, jobs, results_file, workers=None):
+    """
+    Run jobs over a warm process pool and append one JSON line per result.
+
+    Results are flushed as they complete, so an interrupted run can be
+    resumed: files with an error-free line in results_file are skipped.
+
+    Returns:
+    - int: number of jobs that failed.
+    """
+    finished = finished_files(results_file)
+    jobs = [job for job in jobs if (job if isinstance(job, str) else job[1]) not in finished]
+    print(f"{len(jobs)} to do, {len(finished)} already done", file=sys.stderr)
+    if not jobs:
+        return 0
+
+    failed = 0
+    with open(results_file, "a") as out, \
+            ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=warm_up) as pool:
+        futures = [pool.submit(job_function, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            failed += result["error"] is not None
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    return failed
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} decode [-timing PROFILE_OR_SECONDS] DIRECTORY|MANIFEST results.jsonl [workers]")
+    print(f"       {sys.argv[0]} encode MANIFEST results.jsonl [workers]")
+    print("A decode manifest lists one WAV path per line; an encode manifest has lines of DIGITS filename [timing]")
+    print(f"timing is one of {', '.join(DTMFencode.profiles)} or a pulse length in seconds (default {default_timing})")
+    print(f"Example: {sys.argv[0]} decode -timing telephony recordings/ results.jsonl")
+
+if __name__ == "__main__":
+    timing = pop_option("-timing", None)
+    if len(sys.argv) < 4 or sys.argv[1] not in ("decode", "encode"):
+        print_usage()
+    else:
+        command, source, results_file = sys.argv[1:4]
+        workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        if command == "decode":
+            try:
+                if timing is not None:
+                    DTMFencode.profile_of(timing)  # Fail now on a bad name, not once per file
+            except ValueError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            failed = run_batch(partial(decode_job, timing=timing), decode_jobs(source), results_file, workers)
+        else:
+            failed = run_batch(encode_job, encode_jobs(source), results_file, workers)
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import numpy as np
+from scipy.io.wavfile import write
+import DTMFdecode
+import DTMFencode
+from DTMFdecode import pop_option
+import otp_crypto_audio
+
+sample_rate = 44100
+pulse_length = 0.1
+
+# Message lengths in DTMF digits; "hour" is an hour of audio at pulse_length tone + gap
+sizes = {"10": 10, "100": 100, "1k": 1000, "10k": 10000}
+long_sizes = {"hour": int(3600 / (2 * pulse_length))}
+
+default_baseline = "bench_baseline.json"
+
+# Best wall time of repeat runs; the minimum is the least noisy estimate
+def best_time(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_benchmarks(size_names, repeat=3, seed=0):
+    """
+    Time every codec stage on synthetic input of each size.
+
+    Returns:
+    - dict: seconds per "stage/size".
+    """
+    rng = np.random.default_rng(seed)
+    keypad = np.array(list(DTMFdecode.dtmf_keypad))
+    results = {}
+
+    for size_name in size_names:
+        n_digits = {**sizes, **long_sizes}[size_name]
+        digits = "".join(rng.choice(keypad, n_digits))
+        message = rng.integers(0, 256, n_digits // 2, dtype=np.uint8).tobytes()
+        key = rng.integers(0, 256, len(message), dtype=np.uint8).tobytes()
+        dtmf_text = otp_crypto_audio.bytes_to_dtmf(message)
+
+        signal = DTMFencode.generate_dtmf_tone(digits, pulse_length, sample_rate)
+        filtered, rate = DTMFdecode.frontend(signal, sample_rate)
+        # Segment and decode with the timing the signal was made with; the default
+        # 0.1 s minimum silence finds no gaps in it and would time a decode that does nothing
+        durations = DTMFdecode.profile_durations(pulse_length)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "bench.wav")
+            write(filename, sample_rate, signal)
+            decoded = "".join(DTMFdecode.decode_dtmf(filename, timing=pulse_length))
+            if decoded != digits:
+                raise RuntimeError(f"decode_dtmf/{size_name} does not give back the {len(digits)} digits sent; "
+                                   "its time would mean nothing")
+
+            stages = {
+                "generate_dtmf_tone": lambda: DTMFencode.generate_dtmf_tone(digits, pulse_length, sample_rate),
+                "bandpass_filter": lambda: DTMFdecode.bandpass_filter(signal, sample_rate),
+                "detect_silent_regions": lambda: DTMFdecode.detect_silent_regions(
+                    filtered, rate, min_silence_duration=durations["min_silence_duration"]),
+                "decode_dtmf": lambda: DTMFdecode.decode_dtmf(filename, timing=pulse_length),
+                "encrypt_bytes": lambda: otp_crypto_audio.encrypt_bytes(message, key),
+                "bytes_to_dtmf": lambda: otp_crypto_audio.bytes_to_dtmf(message),
+                "dtmf_to_bytes": lambda: otp_crypto_audio.dtmf_to_bytes(dtmf_text),
+            }
+            for stage, function in stages.items():
+                results[f"{stage}/{size_name}"] = best_time(function, repeat)
+                print(f"{stage:>24} {size_name:>5} {results[f'{stage}/{size_name}'] * 1000:12.3f} ms", file=sys.stderr)
+
+    return results
+
+def compare(results, baseline, tolerance=0.25, slack=0.001):
+    """
+    List the stages that got slower than baseline by more than tolerance
+    (relative) and slack seconds (absolute, so microsecond-scale stages
+    don't fail on timer noise).
+    """
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before = baseline[name]
+        ratio = seconds / before if before else float("inf")
+        status = "ok"
+        if seconds > before * (1 + tolerance) and seconds - before > slack:
+            status = "REGRESSION"
+            regressions.append(name)
+        print(f"{name:>30} {before * 1000:12.3f} -> {seconds * 1000:12.3f} ms  x{ratio:6.2f}  {status}")
+    return regressions
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} [-long] [-repeat N] [-save FILE] [-compare FILE] [-tolerance FRACTION]")
+    print(f"-long adds an hour of audio; -save writes a baseline (default {default_baseline});")
+    print("-compare exits non-zero when a stage is slower than the baseline by more than the tolerance (default 0.25)")
+    print(f"Example: {sys.argv[0]} -save {default_baseline}")
+    print(f"Example: {sys.argv[0]} -compare {default_baseline} -tolerance 0.2")
+
+if __name__ == "__main__":
+    if "-h" in sys.argv:
+        print_usage()
+        sys.exit(0)
+
+    size_names = list(sizes)
+    if "-long" in sys.argv:
+        sys.argv.remove("-long")
+        size_names += list(long_sizes)
+    repeat = int(pop_option("-repeat", 3))
+    save_file = pop_option("-save", None)
+    compare_file = pop_option("-compare", None)
+    tolerance = float(pop_option("-tolerance", 0.25))
+    if len(sys.argv) > 1:
+        print_usage()
+        sys.exit(1)
+
+    results = run_benchmarks(size_names, repeat)
+
+    if save_file:
+        with open(save_file, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {save_file}")
+
+    if compare_file:
+        with open(compare_file) as f:
+            regressions = compare(results, json.load(f), tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# In-memory speaker -> air -> microphone channel and encode/decode sweeps over it
+import sys
+import time
+import numpy as np
+from scipy.signal import fftconvolve
+import DTMFdecode
+import DTMFencode
+from DTMFdecode import pop_option
+import framing
+from add_noise import awgn
+from otp_crypto_audio import bytes_to_dtmf, dtmf_to_bytes
+
+sample_rate = 44100
+full_scale = 32767
+
+# Function to clip at a fraction of int16 full scale, as an overdriven speaker or mic would
+def clip(data, level=1.0):
+    return np.clip(data, -level * full_scale, level * full_scale)
+
+# Function to resample for a sender/receiver clock mismatch of drift_ppm parts per million
+def clock_drift(data, drift_ppm):
+    """
+    Play data back at sample_rate * (1 + drift_ppm / 1e6) as heard by a
+    receiver clocked at sample_rate, by linear interpolation. Positive drift
+    means the sender's clock runs fast, so the signal gets shorter.
+
+    Parameters:
+    - data: np.ndarray, samples along the last axis.
+    - drift_ppm: float or np.ndarray, one value per trial (leading axes).
+
+    Returns:
+    - np.ndarray: same shape as data, zero-padded where the signal ran out.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    n = data.shape[-1]
+    drift = np.asarray(drift_ppm, dtype=np.float64)[..., None]
+    positions = np.broadcast_to(np.arange(n) * (1 + drift / 1e6), data.shape)
+    index = np.minimum(positions.astype(np.int64), n - 1)
+    fraction = positions - index
+    following = np.take_along_axis(data, np.minimum(index + 1, n - 1), axis=-1)
+    current = np.take_along_axis(data, index, axis=-1)
+    resampled = current + fraction * (following - current)
+    return np.where(positions <= n - 1, resampled, 0.0)
+
+# Function to model a room as a direct path plus exponentially decaying diffuse noise
+def room_impulse(sample_rate, rt60, n_trials=1, direct_to_reverb=1.0, seed=None):
+    """
+    Random room impulse responses, one per trial.
+
+    Parameters:
+    - rt60: float, seconds for the reverberation to decay by 60 dB.
+    - direct_to_reverb: float, energy ratio of the direct path to the tail.
+
+    Returns:
+    - np.ndarray: (n_trials, rt60 * sample_rate) impulse responses.
+    """
+    rng = np.random.default_rng(seed)
+    length = max(int(rt60 * sample_rate), 1)
+    t = np.arange(length) / sample_rate
+    tail = rng.standard_normal((n_trials, length)) * 10**(-3 * t / rt60)
+    tail /= np.sqrt(np.sum(np.square(tail), axis=1, keepdims=True) * direct_to_reverb)
+    tail[:, 0] = 1.0
+    return tail
+
+# Function to convolve every trial with its impulse response, keeping the original length
+def reverb(data, impulse):
+    data = np.atleast_2d(data)
+    return fftconvolve(data, np.atleast_2d(impulse), mode='full', axes=-1)[:, :data.shape[-1]]
+
+def simulate(pcm, sample_rate, snr_db, n_trials=1, clip_level=None, drift_ppm=0.0, rt60=0.0, seed=None):
+    """
+    Send one signal through n_trials independent channels at once.
+
+    The chain follows the physical path: the speaker clips, the room
+    reverberates, the receiver's clock drifts, and the mic adds noise.
+
+    Parameters:
+    - pcm: np.ndarray, the transmitted signal (1-D).
+    - snr_db: float or np.ndarray, signal-to-noise ratio, one per trial if an array.
+    - clip_level: float, clip at this fraction of full scale, or None.
+    - drift_ppm: float, clock mismatch in parts per million.
+    - rt60: float, reverberation time in seconds, 0 for none.
+    - seed: int, makes the whole run reproducible.
+
+    Returns:
+    - np.ndarray: (n_trials, len(pcm)) float64 received signals.
+    """
+    rng = np.random.default_rng(seed)
+    received = np.broadcast_to(np.asarray(pcm, dtype=np.float64), (n_trials, len(pcm)))
+    if clip_level is not None:
+        received = clip(received, clip_level)
+    if rt60 > 0:
+        received = reverb(received, room_impulse(sample_rate, rt60, n_trials, seed=rng))
+    if drift_ppm:
+        received = clock_drift(received, drift_ppm)
+    snr_db = np.broadcast_to(np.asarray(snr_db, dtype=np.float64), (n_trials,))
+    return awgn(received, -snr_db, seed=rng)
+
+# Levenshtein distance, so dropped and spurious digits count as one error each
+def edit_distance(sent, received):
+    previous = list(range(len(received) + 1))
+    for i, a in enumerate(sent, 1):
+        current = [i]
+        for j, b in enumerate(received, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b)))
+        previous = current
+    return previous[-1]
+
+# Decode every trial of a condition, in one batch unless the profile is gapless
+def decode_trials(received, timing, adaptive=True):
+    profile = DTMFencode.profile_of(timing)
+    if not profile['gap']:
+        return [DTMFdecode.decode_profile(trial, sample_rate, timing) for trial in received]
+    return DTMFdecode.decode_streams(received, sample_rate, adaptive=adaptive,
+                                     **DTMFdecode.profile_durations(timing))
+
+def sweep(timings, snrs, n_digits=32, n_trials=16, clip_level=None, drift_ppm=0.0, rt60=0.0,
+          adaptive=True, seed=0):
+    """
+    Encode random digits with each timing (a profile name or pulse length),
+    pass them through the channel at each SNR and decode all trials of a
+    condition together.
+
+    Returns:
+    - list: one dict per (timing, snr) with the symbol error rate,
+      the link's symbol rate and goodput in symbols per second, and decode
+      speed as a multiple of real time.
+    """
+    rng = np.random.default_rng(seed)
+    keypad = np.array(list(DTMFdecode.dtmf_keypad))
+    results = []
+
+    for timing in timings:
+        digits = "".join(rng.choice(keypad, n_digits))
+        pcm = DTMFencode.generate_profile(digits, timing, sample_rate)
+        symbol_rate = n_digits * sample_rate / len(pcm)
+
+        for snr in snrs:
+            received = simulate(pcm, sample_rate, snr, n_trials, clip_level, drift_ppm, rt60, seed=rng)
+            start = time.perf_counter()
+            decoded = decode_trials(received, timing, adaptive)
+            elapsed = time.perf_counter() - start
+
+            errors = sum(edit_distance(digits, stream) for stream in decoded)
+            symbol_error_rate = errors / (n_digits * n_trials)
+            results.append({
+                "timing": timing,
+                "snr_db": snr,
+                "symbol_error_rate": symbol_error_rate,
+                "symbol_rate": symbol_rate,
+                "goodput": symbol_rate * max(0.0, 1 - symbol_error_rate),
+                "realtime_factor": n_trials * len(pcm) / sample_rate / elapsed,
+            })
+    return results
+
+# Function to tell whether one received trial carries exactly the payload that was sent
+def message_received(trial, payload, timing, framed, adaptive=True):
+    try:
+        if framed:
+            return framing.unframe(*DTMFdecode.decode_slots(trial, sample_rate, timing)) == payload
+        return dtmf_to_bytes("".join(decode_trials(trial[None], timing, adaptive)[0])) == payload
+    except ValueError:
+        return False
+
+def message_sweep(timings, snrs, n_bytes=24, n_trials=16, clip_level=None, drift_ppm=0.0, rt60=0.0,
+                  adaptive=True, seed=0):
+    """
+    Send a random payload as bare digits and in an error-corrected frame
+    (see framing.py) through the channel, and count whole messages that
+    arrive intact on the first transmission.
+
+    Returns:
+    - list: one dict per (timing, framed, snr) with the message success
+      rate, airtime, and goodput in payload bytes per second of airtime
+      (bytes sent times success rate over airtime, i.e. with retries).
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+
+    for timing in timings:
+        payload = rng.integers(0, 256, n_bytes, dtype=np.uint8).tobytes()
+        for framed in (False, True):
+            digits = framing.frame_digits(payload) if framed else bytes_to_dtmf(payload)
+            pcm = DTMFencode.generate_profile(digits, timing, sample_rate)
+            # Some lead-in and tail, as a recording would have
+            pcm = np.concatenate([np.zeros(sample_rate // 4, dtype=np.int16), pcm,
+                                  np.zeros(sample_rate // 4, dtype=np.int16)])
+            airtime = len(pcm) / sample_rate - 0.5
+
+            for snr in snrs:
+                received = simulate(pcm, sample_rate, snr, n_trials, clip_level, drift_ppm, rt60, seed=rng)
+                success = np.mean([message_received(trial, payload, timing, framed, adaptive) for trial in received])
+                results.append({
+                    "timing": timing,
+                    "framed": framed,
+                    "snr_db": snr,
+                    "success_rate": success,
+                    "airtime": airtime,
+                    "goodput": n_bytes * success / airtime,
+                })
+    return results
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} [-timing PROFILE_OR_SECONDS,...] [-snr DB,DB,...] [-digits N | -bytes N] [-trials N] "
+          "[-clip LEVEL] [-drift PPM] [-rt60 S] [-seed N]")
+    print("-bytes sends whole messages of N bytes, bare and framed, and reports how many arrive intact")
+    print(f"Example: {sys.argv[0]} -timing classic,telephony,gapless,0.07 -snr 20,10,0,-5 -rt60 0.3 -drift 100")
+    print(f"Example: {sys.argv[0]} -bytes 24 -timing telephony,gapless -snr 10,5,0")
+
+if __name__ == "__main__":
+    if "-h" in sys.argv:
+        print_usage()
+        sys.exit(0)
+
+    timings = pop_option("-timing", "classic,fast,telephony,gapless").split(",")
+    snrs = [float(x) for x in pop_option("-snr", "20,10,5,0,-5").split(",")]
+    n_digits = int(pop_option("-digits", 32))
+    n_bytes = pop_option("-bytes", None)
+    n_trials = int(pop_option("-trials", 16))
+    clip_level = pop_option("-clip", None)
+    drift_ppm = float(pop_option("-drift", 0.0))
+    rt60 = float(pop_option("-rt60", 0.0))
+    seed = int(pop_option("-seed", 0))
+    if len(sys.argv) > 1:
+        print_usage()
+        sys.exit(1)
+
+    if n_bytes is not None:
+        results = message_sweep(timings, snrs, int(n_bytes), n_trials,
+                                None if clip_level is None else float(clip_level), drift_ppm, rt60, seed=seed)
+        print(f"{'timing':>10} {'framed':>6} {'SNR dB':>7} {'intact':>7} {'airtime':>8} {'goodput B/s':>12}")
+        for r in results:
+            print(f"{r['timing']:>10} {'yes' if r['framed'] else 'no':>6} {r['snr_db']:7.1f} {r['success_rate']:7.2f} "
+                  f"{r['airtime']:8.2f} {r['goodput']:12.2f}")
+        sys.exit(0)
+
+    results = sweep(timings, snrs, n_digits, n_trials, None if clip_level is None else float(clip_level),
+                    drift_ppm, rt60, seed=seed)
+    print(f"{'timing':>10} {'SNR dB':>7} {'SER':>7} {'sym/s':>7} {'goodput':>8} {'x realtime':>11}")
+    for r in results:
+        print(f"{r['timing']:>10} {r['snr_db']:7.1f} {r['symbol_error_rate']:7.3f} {r['symbol_rate']:7.2f} "
+              f"{r['goodput']:8.2f} {r['realtime_factor']:11.1f}")
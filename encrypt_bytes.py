@@ -1,4 +1,5 @@
 import sys
+from xor_engine import xor_file
 #encrypt_bytes.py input_filename key_filename output_filename
 
 
@@ -9,25 +10,9 @@ if __name__ == "__main__":
     input_filename = sys.argv[1]
     key_filename = sys.argv[2]
     output_filename = sys.argv[3]
-#{{{{{{{{{{{{{{{{{{{{{{{}}}}}}}}}}}}}}}}}}}}}}}
-    inputTxt = bytearray(open(input_filename, "rb").read())
-    keyTxt = bytearray(open(key_filename, "rb").read())
 
-    if len(inputTxt) > len(keyTxt) :
+    # Streams input and key from memory maps in chunks, so files of any size fit
+    try:
+        xor_file(input_filename, key_filename, output_filename)
+    except ValueError:
         print("error")
-    else:
-        outputTxt = bytearray((len(inputTxt)))    
-        for i in range(0,len(inputTxt)) :
-            outputTxt[i] = inputTxt[i] ^ keyTxt[i]
-        with open(output_filename, 'wb') as f:
-            f.write(outputTxt)
-
-
-
-
-
-    encrypting = ''
-
-
-
-
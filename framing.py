@@ -0,0 +1,331 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Framing and forward error correction for the DTMF symbol stream.
+#
+# A frame is a preamble followed by Reed-Solomon codewords over GF(16), so
+# each code symbol is one DTMF digit (one nibble). The codewords carry
+#   2-byte length | payload | 2-byte CRC-16 (CCITT) of length and payload
+# as nibbles, high nibble first, in codewords of up to 15 - parity data
+# symbols plus parity symbols; the last codeword is shortened rather than
+# padded. A codeword corrects e wrong symbols and f erased ones as long as
+# 2e + f <= parity, and the receiver marks symbols it is unsure of as
+# erasures, so most damaged symbols cost one parity symbol, not two.
+import sys
+import binascii
+import itertools
+
+# Marks the start of a frame; decoding looks for it with one symbol of slack
+preamble = "#D*D"
+
+# Parity symbols per codeword: corrects 2 errors, 4 erasures, or 1 error and 2 erasures in every 15 symbols
+default_parity = 4
+
+# Nibble value of each DTMF digit, as in bytes_to_dtmf (E and F are sent as * and #)
+nibble_digits = "0123456789ABCD*#"
+digit_nibbles = {digit: value for value, digit in enumerate(nibble_digits)}
+
+# GF(16) with the primitive polynomial x^4 + x + 1 and generator 2
+field_size = 15
+gf_exp = [0] * (2 * field_size)
+gf_log = [0] * (field_size + 1)
+x = 1
+for i in range(field_size):
+    gf_exp[i] = gf_exp[i + field_size] = x
+    gf_log[x] = i
+    x <<= 1
+    if x & 0x10:
+        x ^= 0x13
+
+class ReedSolomonError(ValueError):
+    pass
+
+def gf_mul(a, b):
+    return 0 if a == 0 or b == 0 else gf_exp[gf_log[a] + gf_log[b]]
+
+def gf_div(a, b):
+    return 0 if a == 0 else gf_exp[(gf_log[a] + field_size - gf_log[b]) % field_size]
+
+def gf_pow(a, power):
+    return gf_exp[(gf_log[a] * power) % field_size]
+
+def gf_inverse(a):
+    return gf_exp[field_size - gf_log[a]]
+
+# Polynomials are lists of coefficients, highest degree first
+def poly_scale(p, a):
+    return [gf_mul(c, a) for c in p]
+
+def poly_add(p, q):
+    r = [0] * max(len(p), len(q))
+    for i, c in enumerate(p):
+        r[i + len(r) - len(p)] = c
+    for i, c in enumerate(q):
+        r[i + len(r) - len(q)] ^= c
+    return r
+
+def poly_mul(p, q):
+    r = [0] * (len(p) + len(q) - 1)
+    for j, b in enumerate(q):
+        for i, a in enumerate(p):
+            r[i + j] ^= gf_mul(a, b)
+    return r
+
+def poly_eval(p, a):
+    y = p[0]
+    for c in p[1:]:
+        y = gf_mul(y, a) ^ c
+    return y
+
+# Remainder of dividend / divisor for a monic divisor
+def poly_mod(dividend, divisor):
+    out = list(dividend)
+    for i in range(len(dividend) - len(divisor) + 1):
+        coef = out[i]
+        if coef:
+            for j in range(1, len(divisor)):
+                out[i + j] ^= gf_mul(divisor[j], coef)
+    return out[len(out) - len(divisor) + 1:]
+
+def generator_poly(parity):
+    g = [1]
+    for i in range(parity):
+        g = poly_mul(g, [1, gf_exp[i]])
+    return g
+
+# Function to append parity symbols to up to 15 - parity data symbols
+def rs_encode(data, parity=default_parity):
+    return list(data) + poly_mod(list(data) + [0] * parity, generator_poly(parity))
+
+def syndromes(codeword, parity):
+    return [poly_eval(codeword, gf_exp[i]) for i in range(parity)]
+
+# Berlekamp-Massey on syndromes with the erasures already factored out (Forney syndromes)
+def error_locator(forney_syndromes, parity, erasure_count):
+    locator, previous = [1], [1]
+    for i in range(parity - erasure_count):
+        delta = forney_syndromes[i]
+        for j in range(1, len(locator)):
+            delta ^= gf_mul(locator[-(j + 1)], forney_syndromes[i - j])
+        previous = previous + [0]
+        if delta:
+            if len(previous) > len(locator):
+                locator, previous = poly_scale(previous, delta), poly_scale(locator, gf_inverse(delta))
+            locator = poly_add(locator, poly_scale(previous, delta))
+    while len(locator) > 1 and locator[0] == 0:
+        del locator[0]
+    if 2 * (len(locator) - 1) + erasure_count > parity:
+        raise ReedSolomonError("Too many errors to correct")
+    return locator
+
+def rs_decode(codeword, parity=default_parity, erasures=()):
+    """
+    Correct a (possibly shortened) codeword and return its data symbols.
+
+    Parameters:
+    - codeword: list of int, received symbols 0-15 (erased ones may hold anything).
+    - erasures: positions in codeword known to be unreliable.
+
+    Raises ReedSolomonError when the damage is beyond the code.
+    """
+    n = len(codeword)
+    codeword = list(codeword)
+    erasures = sorted(set(erasures))
+    for position in erasures:
+        codeword[position] = 0
+    if len(erasures) > parity:
+        raise ReedSolomonError("Too many erasures to correct")
+
+    synd = syndromes(codeword, parity)
+    if not any(synd):
+        return codeword[:n - parity]
+
+    # Forney syndromes: remove the known erasure locations from the syndromes
+    forney = list(synd)
+    for position in erasures:
+        x = gf_exp[n - 1 - position]
+        for j in range(len(forney) - 1):
+            forney[j] = gf_mul(forney[j], x) ^ forney[j + 1]
+    locator = error_locator(forney, parity, len(erasures))
+
+    # Chien search for the error positions
+    errors = [n - 1 - i for i in range(n) if poly_eval(locator[::-1], gf_exp[i]) == 0]
+    if len(errors) != len(locator) - 1:
+        raise ReedSolomonError("Could not locate the errors")
+
+    # Forney algorithm for the magnitudes of errors and erasures together. With
+    # the syndromes S(x) and errata locator L(x) lowest degree first, the
+    # evaluator is S(x) L(x) mod x^parity, and since the code's first root is
+    # 1 the magnitude at locator X is evaluator(1/X) / prod(1 - X'/X) over the other X'
+    positions = erasures + errors
+    roots = [gf_exp[n - 1 - p] for p in positions]
+    locator_low = [1]
+    for root in roots:
+        locator_low = poly_mul(locator_low, [1, root])
+    evaluator = poly_mul(synd, locator_low)[:parity][::-1]
+    correction = [0] * n
+    for i, root in enumerate(roots):
+        root_inverse = gf_inverse(root)
+        denominator = 1
+        for j, other in enumerate(roots):
+            if j != i:
+                denominator = gf_mul(denominator, 1 ^ gf_mul(root_inverse, other))
+        if denominator == 0:
+            raise ReedSolomonError("Could not find the error magnitude")
+        correction[positions[i]] = gf_div(poly_eval(evaluator, root_inverse), denominator)
+
+    codeword = [a ^ b for a, b in zip(codeword, correction)]
+    if any(syndromes(codeword, parity)):
+        raise ReedSolomonError("Could not correct the codeword")
+    return codeword[:n - parity]
+
+def to_nibbles(data):
+    return [n for byte in data for n in (byte >> 4, byte & 15)]
+
+def from_nibbles(nibbles):
+    return bytes((nibbles[i] << 4) | nibbles[i + 1] for i in range(0, len(nibbles) - 1, 2))
+
+# Sizes of the codewords carrying n_nibbles data nibbles: full ones, then a shortened one
+def codeword_sizes(n_nibbles, parity):
+    k = field_size - parity
+    sizes = [k] * (n_nibbles // k)
+    if n_nibbles % k:
+        sizes.append(n_nibbles % k)
+    return sizes
+
+# Data nibbles in a frame: length, payload and CRC, zero-padded to fill at
+# least the first codeword so the receiver can read the length before it
+# knows how long the frame is
+def frame_nibbles(length, parity):
+    return max(2 * (2 + length + 2), field_size - parity)
+
+def frame_digits(payload, parity=default_parity):
+    """
+    Frame a payload for sending: the preamble, then the length, payload and
+    CRC protected by Reed-Solomon codewords.
+
+    Returns:
+    - str: DTMF digits.
+    """
+    if len(payload) > 0xFFFF:
+        raise ValueError("Payload is too long for one frame.")
+    body = len(payload).to_bytes(2, 'big') + bytes(payload)
+    nibbles = to_nibbles(body + binascii.crc_hqx(body, 0xFFFF).to_bytes(2, 'big'))
+    nibbles += [0] * (frame_nibbles(len(payload), parity) - len(nibbles))
+
+    digits = [preamble]
+    start = 0
+    for size in codeword_sizes(len(nibbles), parity):
+        codeword = rs_encode(nibbles[start:start + size], parity)
+        digits.append("".join(nibble_digits[n] for n in codeword))
+        start += size
+    return "".join(digits)
+
+# Positions just after each preamble, allowing one wrong or missing symbol
+def find_preambles(symbols):
+    for i in range(len(symbols) - len(preamble) + 1):
+        if sum(a == b for a, b in zip(symbols[i:i + len(preamble)], preamble)) >= len(preamble) - 1:
+            yield i + len(preamble)
+
+# Decodes of one codeword, most plausible first. The least confident symbols
+# are erased, from just the unknown ones up to as many as the parity allows:
+# with few erasures confidently wrong symbols are corrected as errors, with
+# many the doubtful ones are replaced. Erasing the full parity always yields
+# some codeword, so no single decode can be trusted: distinct decodes are
+# ranked by how many received symbols they overrule, then by the total
+# confidence of those, and the frame CRC decides between them.
+def codeword_candidates(values, confidence, parity):
+    order = sorted(range(len(values)), key=lambda i: confidence[i])
+    unknown = sum(v < 0 for v in values)
+    received = [max(v, 0) for v in values]
+    costs = {}
+    for n_erased in range(unknown, parity + 1):
+        try:
+            data = rs_decode(received, parity, order[:n_erased])
+        except ReedSolomonError:
+            continue
+        codeword = rs_encode(data, parity)
+        overruled = [c for v, c, d in zip(values, confidence, codeword) if 0 <= v != d]
+        costs.setdefault(tuple(data), (len(overruled), sum(overruled)))
+    return [list(data) for data in sorted(costs, key=costs.get)]
+
+def unframe(symbols, confidence=None, parity=default_parity):
+    """
+    Recover the payload of a frame from received symbols.
+
+    Parameters:
+    - symbols: sequence of DTMF digits, one per symbol slot; anything else
+      (e.g. '?') marks a slot where no digit was heard.
+    - confidence: sequence of float, how sure the detector was of each
+      symbol, e.g. the ratio of the winning tone to the runner-up. The least
+      confident symbols of a codeword are treated as erasures.
+
+    Returns:
+    - bytes: the payload.
+
+    Raises ValueError when there is no frame, or it cannot be corrected or
+    fails its CRC.
+    """
+    if confidence is None:
+        confidence = [1.0] * len(symbols)
+    error = ValueError("No frame preamble found.")
+    # Noise before the frame can look like a preamble; try every candidate
+    for start in find_preambles(symbols):
+        try:
+            return read_frame([digit_nibbles.get(s, -1) for s in symbols[start:]],
+                              [c if s in digit_nibbles else 0.0 for s, c in zip(symbols[start:], confidence[start:])],
+                              parity)
+        except ValueError as e:
+            error = e
+    raise error
+
+# Decode the codewords after a preamble into the payload
+def read_frame(values, confidence, parity, max_checks=32):
+    """
+    Try combinations of codeword candidates, best first, until one passes
+    the CRC. max_checks bounds the search: every check of a wrong frame has
+    a 1 in 65536 chance of passing the CRC anyway.
+    """
+    k = field_size - parity
+    error = ValueError("Codeword is beyond repair.")
+    checks = 0
+    if len(values) < k + parity:
+        raise ValueError("Frame is cut short.")
+    # The first codeword is always full and holds the length, which sizes the rest
+    for first in codeword_candidates(values[:k + parity], confidence[:k + parity], parity):
+        length = int.from_bytes(from_nibbles(first[:4]), 'big')
+        candidates = [[first]]
+        position = k + parity
+        for size in codeword_sizes(frame_nibbles(length, parity), parity)[1:]:
+            end = position + size + parity
+            if end > len(values):
+                error = ValueError("Frame is cut short.")
+                break
+            options = codeword_candidates(values[position:end], confidence[position:end], parity)
+            if not options:
+                error = ValueError("Codeword is beyond repair.")
+                break
+            candidates.append(options)
+            position = end
+        else:
+            for combination in itertools.product(*candidates):
+                data = from_nibbles([n for codeword in combination for n in codeword])
+                body, crc = data[:2 + length], data[2 + length:4 + length]
+                if binascii.crc_hqx(body, 0xFFFF).to_bytes(2, 'big') == crc:
+                    return body[2:]
+                error = ValueError("Frame failed its CRC check.")
+                checks += 1
+                if checks >= max_checks:
+                    raise error
+    raise error
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} HEX")
+    print("Prints the DTMF digits of a frame carrying the given bytes")
+    print(f"Example: {sys.argv[0]} 48656C6C6F")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print_usage()
+    else:
+        print(frame_digits(bytes.fromhex(sys.argv[1])))
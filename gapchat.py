@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# In-process pipeline: message -> encrypted payload -> DTMF symbols -> PCM, and back
+import io
+import os
+import sys
+import wave
+import random
+from collections.abc import Mapping
+import numpy as np
+from scipy.io.wavfile import read
+import DTMFdecode
+import DTMFencode
+import MFSKdecode
+import MFSKencode
+import framing
+import pads
+import profiling
+from keystore import KeyStore, store_path
+from compression import compress_message, decompress_message, stored
+from otp_crypto_audio import encrypt_bytes, bytes_to_dtmf, dtmf_to_bytes, keys_dir, list_keys, read_key
+
+sample_rate = 44100
+# A DTMFencode.profiles name, a pulse length in seconds, or 'mfsk' to send one
+# byte per symbol with MFSKencode instead of two DTMF digits
+timing = 'classic'
+
+class KeyDirectory(Mapping):
+    """Keys in keys_dir by numeric id (keys/N.bin), read only when used."""
+
+    def __init__(self, directory=keys_dir):
+        self.directory = directory
+
+    def __getitem__(self, key_id):
+        try:
+            return read_key(key_file_name(key_id), self.directory)
+        except FileNotFoundError:
+            raise KeyError(key_id)
+
+    def __iter__(self):
+        return (key_id_of(key_file) for key_file in list_keys(self.directory))
+
+    def __len__(self):
+        return len(list_keys(self.directory))
+
+# Function to open the packed key store when there is one, else the keys directory
+def open_keys(directory=keys_dir, store=store_path):
+    return KeyStore(store) if os.path.exists(store) else KeyDirectory(directory)
+
+# Key files are named N.bin; the payload header carries N
+def key_file_name(key_id):
+    return f"{key_id}.bin"
+
+def key_id_of(key_file):
+    return int(os.path.splitext(key_file)[0])
+
+# Top bit of the 2-byte id at the start of a payload: set when the message was
+# encrypted with a range of a large pad (see pads.py) rather than a key file. The
+# pad id is then followed by the 4-byte big-endian offset of the range.
+pad_flag = 0x8000
+
+# Function to prepare message bytes for encryption: the compression flag byte and the (possibly compressed) message
+def plain_bytes(message_bytes, compress=True):
+    return compress_message(message_bytes) if compress else bytes([stored]) + message_bytes
+
+# Function to encrypt message bytes into a payload: 2-byte big-endian key id, then the ciphertext of plain_bytes
+def encrypt_payload(message_bytes, key_id, key_bytes, compress=True):
+    if not 0 <= key_id < pad_flag:
+        raise ValueError(f"Key id {key_id} cannot be sent; ids from {pad_flag} up mark pads.")
+    plain = plain_bytes(message_bytes, compress)
+    return key_id.to_bytes(2, 'big') + bytes(encrypt_bytes(plain, key_bytes))
+
+# Function to encrypt message bytes with the next unused range of a pads.Pad, whatever their length
+def pad_payload(message_bytes, pad, compress=True):
+    plain = plain_bytes(message_bytes, compress)
+    offset = pad.allocate(len(plain))
+    header = (pad_flag | pad.pad_id).to_bytes(2, 'big') + offset.to_bytes(4, 'big')
+    return header + bytes(encrypt_bytes(plain, pad.read(offset, len(plain))))
+
+# Function to decrypt the part of a pad payload after its id, recording the range as used
+def decrypt_pad(pad_id, data, directory=pads.pads_dir):
+    if len(data) < 4:
+        raise ValueError("Pad payload is too short to hold an offset.")
+    offset, encrypted_bytes = int.from_bytes(data[:4], 'big'), data[4:]
+    try:
+        pad = pads.Pad(pad_id, directory)
+    except FileNotFoundError:
+        raise ValueError(f"Pad file '{pads.pad_file_name(pad_id)}' not found in '{directory}'.")
+    with pad:
+        # Refuses a range this side also sent with, before anything is decrypted
+        pad.mark_used(offset, len(encrypted_bytes))
+        plain = bytes(encrypt_bytes(encrypted_bytes, pad.read(offset, len(encrypted_bytes))))
+    return plain
+
+# Function to split a payload back into key id and ciphertext
+def parse_payload(payload):
+    if len(payload) < 2:
+        raise ValueError("Payload is too short to hold a key id.")
+    return int.from_bytes(payload[:2], 'big'), payload[2:]
+
+# Function to modulate a payload: one MFSK symbol or two DTMF symbols per byte. DTMF
+# payloads are framed with error correction (see framing.py) unless framed is False.
+def payload_to_pcm(payload, timing=timing, sample_rate=sample_rate, blocks=False, framed=True):
+    if timing == 'mfsk':
+        pcm = MFSKencode.generate_mfsk(payload, sample_rate=sample_rate)
+        return [pcm] if blocks else pcm
+    digits = framing.frame_digits(payload) if framed else bytes_to_dtmf(payload)
+    return DTMFencode.generate_profile(digits, timing, sample_rate, blocks)
+
+# Function to demodulate PCM back into a payload; MFSK is recognised by its mode marker
+def pcm_to_payload(pcm, sample_rate=sample_rate, timing=timing, framed=True):
+    if MFSKdecode.detect_mode(pcm, sample_rate) == "mfsk":
+        return MFSKdecode.decode_mfsk(pcm, sample_rate)
+    if framed:
+        return framing.unframe(*DTMFdecode.decode_slots(pcm, sample_rate, timing))
+    return dtmf_to_bytes("".join(DTMFdecode.decode_profile(pcm, sample_rate, timing)))
+
+# Function to pick a random key id; a KeyStore has its ids in an array already
+def random_key_id(keys):
+    key_ids = keys.ids if isinstance(keys, KeyStore) else list(keys)
+    if not len(key_ids):
+        raise ValueError(f"No key files found in '{keys_dir}'")
+    return int(random.choice(key_ids))
+
+# Function to encrypt message bytes with a random key into the payload to send
+def random_key_payload(message_bytes, keys, compress=True):
+    key_id = random_key_id(keys)
+    return encrypt_payload(message_bytes, key_id, keys[key_id], compress)
+
+def encode_message(message_bytes, keys, timing=timing, sample_rate=sample_rate, compress=True, framed=True, pad=None):
+    """
+    Encrypt message_bytes with a random key, or the next range of a pad, and modulate the result.
+
+    Parameters:
+    - message_bytes: bytes, the plain text.
+    - keys: mapping from key id to key bytes, e.g. open_keys().
+    - timing: str or float, a DTMFencode.profiles name, a pulse length in
+      seconds, or 'mfsk'.
+    - compress: bool, deflate the message first when that makes it shorter.
+    - framed: bool, send DTMF in an error-corrected frame; the receiver must agree.
+    - pad: pads.Pad to encrypt with instead of a key from keys.
+
+    Returns:
+    - np.ndarray: int16 PCM at sample_rate.
+    """
+    if pad is not None:
+        payload = pad_payload(message_bytes, pad, compress)
+    else:
+        payload = random_key_payload(message_bytes, keys, compress)
+    return payload_to_pcm(payload, timing, sample_rate, framed=framed)
+
+def decode_message(pcm, sample_rate, keys, timing=timing, framed=True):
+    """Demodulate PCM and decrypt it with the key or pad named in the payload; returns the plain text bytes."""
+    key_id, encrypted_bytes = parse_payload(pcm_to_payload(pcm, sample_rate, timing, framed))
+    if key_id & pad_flag:
+        return decompress_message(decrypt_pad(key_id & ~pad_flag, encrypted_bytes))
+    if key_id not in keys:
+        raise ValueError(f"Key file '{key_file_name(key_id)}' not found in '{keys_dir}'.")
+    return decompress_message(bytes(encrypt_bytes(encrypted_bytes, keys[key_id])))
+
+# Write mono int16 PCM as a WAV file; works on pipes since the length is known up front
+def write_wav(stream, pcm, sample_rate=sample_rate):
+    with wave.open(stream, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.setnframes(len(pcm))
+        wf.writeframes(pcm.astype('<i2').tobytes())
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} [--profile] encode [-raw | -play] [-nocompress] [-noframe] [-pad ID] [timing] < message > dtmf.wav")
+    print(f"       {sys.argv[0]} [--profile] decode [-raw] [-noframe] [-rate HZ] [timing] < dtmf.wav > message")
+    print("-raw reads or writes headerless 16-bit little-endian mono PCM instead of WAV;")
+    print("-play plays the message on the sound card; both start output with the first symbol;")
+    print("-nocompress sends the message as is instead of deflating it when that is shorter;")
+    print("-noframe sends or expects bare DTMF digits without the error-correcting frame;")
+    print(f"-pad encrypts with the next unused bytes of {pads.pads_dir}/ID.pad instead of a random key file")
+    print("(each end sends from its own end of the pad: run pads.py side ID front at one end, back at the other)")
+    print(f"timing is one of {', '.join(DTMFencode.profiles)}, mfsk, or a pulse length in seconds (default {timing});")
+    print("decode recognises MFSK by itself, so its timing only matters for DTMF")
+    print(f"Example: python3 get_input.py | {sys.argv[0]} encode telephony > dtmf.wav")
+    print(f"Example: python3 get_input.py | {sys.argv[0]} encode -raw gapless | aplay -f S16_LE -r {sample_rate}")
+
+if __name__ == "__main__":
+    profiling.from_argv(sys.argv)
+    if len(sys.argv) < 2 or sys.argv[1] not in ("encode", "decode"):
+        print_usage()
+        sys.exit(1)
+
+    command = sys.argv.pop(1)
+    raw = "-raw" in sys.argv
+    if raw:
+        sys.argv.remove("-raw")
+    play = "-play" in sys.argv
+    if play:
+        sys.argv.remove("-play")
+    compress = "-nocompress" not in sys.argv
+    if not compress:
+        sys.argv.remove("-nocompress")
+    framed = "-noframe" not in sys.argv
+    if not framed:
+        sys.argv.remove("-noframe")
+    pad_id = DTMFdecode.pop_option("-pad", None)
+    pad_id = int(pad_id) if pad_id is not None else None
+    rate = int(DTMFdecode.pop_option("-rate", sample_rate))
+    message_timing = sys.argv[1] if len(sys.argv) > 1 else timing
+
+    try:
+        if command == "encode":
+            message_bytes = sys.stdin.buffer.read()
+            if pad_id is not None:
+                with pads.Pad(pad_id) as pad:
+                    payload = pad_payload(message_bytes, pad, compress)
+            else:
+                payload = random_key_payload(message_bytes, open_keys(), compress)
+            if play:
+                DTMFencode.play_pcm(payload_to_pcm(payload, message_timing, rate, True, framed), rate)
+            elif raw:
+                DTMFencode.write_pcm(sys.stdout.buffer, payload_to_pcm(payload, message_timing, rate, True, framed))
+            else:
+                write_wav(sys.stdout.buffer, payload_to_pcm(payload, message_timing, rate, framed=framed), rate)
+        else:
+            if raw:
+                pcm = np.frombuffer(sys.stdin.buffer.read(), dtype='<i2')
+            else:
+                rate, pcm = read(io.BytesIO(sys.stdin.buffer.read()))
+                if pcm.ndim > 1:
+                    pcm = pcm[:, 0]
+            sys.stdout.buffer.write(decode_message(pcm, rate, open_keys(), message_timing, framed))
+        sys.stdout.flush()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Thin client for gapchat_daemon.py; imports only the standard library so it starts instantly
+import os
+import sys
+import json
+import socket
+import tempfile
+
+# Same default as gapchat_daemon.socket_path, overridable with GAPCHAT_SOCKET
+socket_path = os.environ.get("GAPCHAT_SOCKET", os.path.join(tempfile.gettempdir(), f"gapchat-{os.getuid()}.sock"))
+
+# Positional arguments of each operation; file names are sent as absolute paths
+arguments = {
+    "encode": ("digits", "filename", "timing"),
+    "decode": ("filename", "timing"),
+    "encrypt": ("message",),
+    "decrypt": ("text",),
+    "send": ("message", "filename", "timing"),
+    "receive": ("filename", "timing"),
+    "reload": (),
+}
+
+# Send one request and wait for its response
+def request(op, path=socket_path, **fields):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(dict(fields, op=op), ensure_ascii=False) + "\n").encode('utf-8'))
+        with sock.makefile('r', encoding='utf-8') as f:
+            return json.loads(f.readline())
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} OPERATION [ARGUMENTS]")
+    for op, names in arguments.items():
+        print(f"  {op} {' '.join(names)}")
+    print(f"Example: {sys.argv[0]} send \"Merhaba\" dtmf.wav telephony")
+    print(f"Example: {sys.argv[0]} receive dtmf.wav telephony")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in arguments:
+        print_usage()
+        sys.exit(1)
+
+    op = sys.argv[1]
+    names = arguments[op]
+    values = sys.argv[2:]
+    required = len([name for name in names if name != "timing"])
+    if not required <= len(values) <= len(names):
+        print_usage()
+        sys.exit(1)
+
+    fields = dict(zip(names, values))
+    if "filename" in fields:
+        fields["filename"] = os.path.abspath(fields["filename"])
+
+    try:
+        response = request(op, **fields)
+    except OSError as e:
+        print(f"Error: cannot reach gapchat_daemon at {socket_path}: {e}")
+        sys.exit(1)
+
+    if response["ok"]:
+        print(response["result"])
+    else:
+        print(f"Error: {response['error']}")
+        sys.exit(1)
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+from scipy.io.wavfile import read, write
+import DTMFdecode
+import DTMFencode
+import otp_crypto_audio
+import gapchat
+import keystore
+import pads
+
+sample_rate = 44100
+
+# Default socket path, one per user
+socket_path = os.path.join(tempfile.gettempdir(), f"gapchat-{os.getuid()}.sock")
+
+class Codec:
+    """
+    The work behind each request, with the key store held in memory.
+
+    Every method takes the request fields as keyword arguments and returns
+    a JSON-serialisable result; errors are raised as exceptions.
+    """
+
+    def __init__(self, keys_dir=otp_crypto_audio.keys_dir, store=keystore.store_path, pads_dir=pads.pads_dir):
+        self.keys_dir = keys_dir
+        self.store = store
+        self.pads_dir = pads_dir
+        self.keys = {}
+        self.reload()
+
+    # Map the packed key store if there is one, else read the keys directory into memory.
+    # The new keys are swapped in whole and the old store is never closed here:
+    # requests on other worker threads may still be using it, and its mapping is
+    # released once the last of them lets go. Each request reads self.keys once.
+    def reload(self):
+        if os.path.exists(self.store):
+            keys = keystore.KeyStore(self.store)
+        else:
+            keys = {gapchat.key_id_of(key_file): key_bytes
+                    for key_file, key_bytes in otp_crypto_audio.load_keys(self.keys_dir).items()}
+        self.keys = keys
+        return len(keys)
+
+    # timing is a DTMFencode.profiles name or a pulse length in seconds
+    def encode(self, digits, filename, timing=1.0):
+        write(filename, sample_rate, DTMFencode.generate_profile(digits, timing, sample_rate))
+        return filename
+
+    def decode(self, filename, timing=None):
+        return "".join(DTMFdecode.decode_dtmf(filename, timing=timing))
+
+    def encrypt(self, message):
+        keys = self.keys
+        key_id = gapchat.random_key_id(keys)
+        return otp_crypto_audio.encrypt_message(message, gapchat.key_file_name(key_id), keys[key_id])
+
+    def decrypt(self, text):
+        key_file, encrypted_bytes = otp_crypto_audio.parse_encrypted(text)
+        # P.pad@OFFSET names a range of a pad, not a key file
+        if '@' in key_file:
+            key_bytes = otp_crypto_audio.read_pad_range(key_file, len(encrypted_bytes), self.pads_dir)
+            return otp_crypto_audio.encrypt_bytes(encrypted_bytes, key_bytes).decode('utf-8')
+        key_id, keys = gapchat.key_id_of(key_file), self.keys
+        if key_id not in keys:
+            raise ValueError(f"Key file '{key_file}' not found in '{self.keys_dir}'.")
+        return otp_crypto_audio.encrypt_bytes(encrypted_bytes, keys[key_id]).decode('utf-8')
+
+    # What otp_encode.sh does: encrypt and modulate the message into a WAV
+    def send(self, message, filename, timing=gapchat.timing):
+        pcm = gapchat.encode_message(message.encode('utf-8'), self.keys, timing, sample_rate)
+        with open(filename, 'wb') as f:
+            gapchat.write_wav(f, pcm, sample_rate)
+        return filename
+
+    # What otp_decode.sh does after recording: demodulate the WAV and decrypt
+    def receive(self, filename, timing=gapchat.timing):
+        rate, pcm = read(filename)
+        if pcm.ndim > 1:
+            pcm = pcm[:, 0]
+        return gapchat.decode_message(pcm, rate, self.keys, timing).decode('utf-8')
+
+operations = ("encode", "decode", "encrypt", "decrypt", "send", "receive", "reload")
+
+async def worker(codec, queue):
+    loop = asyncio.get_running_loop()
+    while True:
+        request, reply = await queue.get()
+        try:
+            op = request.pop("op", None)
+            if op not in operations:
+                raise ValueError(f"Unknown operation {op!r}")
+            result = await loop.run_in_executor(None, lambda: getattr(codec, op)(**request))
+            reply.set_result({"ok": True, "result": result})
+        except Exception as e:
+            reply.set_result({"ok": False, "error": str(e)})
+        finally:
+            queue.task_done()
+
+async def handle_client(queue, reader, writer):
+    # One JSON request per line, answered in order with one JSON line each
+    try:
+        while line := await reader.readline():
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"ok": False, "error": "Request is not valid JSON"}
+            else:
+                reply = asyncio.get_running_loop().create_future()
+                await queue.put((request, reply))  # Waits while the queue is full
+                response = await reply
+            writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def serve(path=socket_path, workers=2, queue_size=16):
+    """
+    Serve requests on a Unix domain socket until cancelled.
+
+    At most queue_size requests wait at a time; once the queue is full,
+    clients are not read from until a worker frees a slot. Workers hand the
+    numpy/scipy work to a thread pool so the event loop stays responsive.
+    """
+    codec = Codec()
+    queue = asyncio.Queue(maxsize=queue_size)
+    tasks = [asyncio.create_task(worker(codec, queue)) for _ in range(workers)]
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(lambda r, w: handle_client(queue, r, w), path=path)
+    os.chmod(path, 0o600)
+    print(f"Listening on {path} with {len(codec.keys)} keys", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+        if os.path.exists(path):
+            os.unlink(path)
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} [socket_path] [workers]")
+    print(f"Example: {sys.argv[0]} {socket_path} 2")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 or "-h" in sys.argv:
+        print_usage()
+    else:
+        path = sys.argv[1] if len(sys.argv) > 1 else socket_path
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        try:
+            asyncio.run(serve(path, workers))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,4 @@
+#!/bin/bash
+# Regenerate keys/1.bin .. keys/1024.bin in one pass (the "Anahtar Yarat" button in arayuz.py)
+cd "$(dirname "$0")"
+python3 keygen.py -start 1 1024
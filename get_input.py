@@ -58,4 +58,5 @@ def gui_input(prompt):
     return value
 
 mesaj = gui_input("Sifrelenecek Mesaj")
-print(mesaj)
+# No trailing newline: gapchat.py encode sends its input byte for byte
+print(mesaj, end='')
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Bulk key generation: many keys/N.bin files, a packed key store, or one large
+# pad, from the OS random source in large reads.
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import keystore
+from DTMFdecode import pop_option
+import pads
+from otp_crypto_audio import keys_dir
+
+key_size = 255
+# 16 MiB per os.urandom call; each call is one or a few getrandom() system calls
+chunk_size = 1 << 24
+
+def random_chunks(n_bytes, jobs=1, chunk_size=chunk_size):
+    """
+    Yield n_bytes of OS randomness in order, chunk_size bytes at a time.
+
+    With jobs > 1 the chunks of each batch of jobs are read on that many
+    threads; os.urandom releases the GIL while the kernel fills the buffer.
+    Memory stays at jobs chunks however much is generated.
+    """
+    sizes = [min(chunk_size, n_bytes - start) for start in range(0, n_bytes, chunk_size)]
+    if jobs <= 1:
+        for size in sizes:
+            yield os.urandom(size)
+        return
+    with ThreadPoolExecutor(jobs) as executor:
+        for batch in range(0, len(sizes), jobs):
+            yield from executor.map(os.urandom, sizes[batch:batch + jobs])
+
+# Function to add keys to a packed key store, creating it if needed
+def add_to_store(keys, path=keystore.store_path):
+    if os.path.exists(path):
+        with keystore.KeyStore(path) as store:
+            keys = {**{key_id: store[key_id] for key_id in store}, **keys}
+    return keystore.write_store(keys, path)
+
+# Function to generate count keys of size bytes, numbered from start, as {key id: key bytes}
+def generate_keys(count, size=key_size, start=1, jobs=1):
+    data = b"".join(random_chunks(count * size, jobs))
+    return {start + i: data[i * size:(i + 1) * size] for i in range(count)}
+
+# Function to write keys into the keys/N.bin layout
+def write_key_files(keys, directory=keys_dir):
+    os.makedirs(directory, exist_ok=True)
+    for key_id, key_bytes in keys.items():
+        with open(os.path.join(directory, f"{key_id}.bin"), 'wb') as f:
+            f.write(key_bytes)
+
+# Function to find the key store kept next to a keys directory, as keys.store is next to
+# keys/, wherever it is run from; None for a directory not named like the keys directory
+def store_beside(directory):
+    directory = os.path.abspath(directory)
+    if os.path.basename(directory) != os.path.basename(os.path.normpath(keys_dir)):
+        return None
+    return os.path.join(os.path.dirname(directory), keystore.store_path)
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} [-size BYTES] [-start ID] [-jobs N] [-dir DIR | -store FILE] COUNT")
+    print(f"       {sys.argv[0]} [-jobs N] -pad ID SIZE")
+    print(f"Writes COUNT keys of BYTES (default {key_size}) random bytes as DIR/N.bin (default {keys_dir}),")
+    print(f"or into a packed key store, or one pad of SIZE bytes as {pads.pads_dir}/ID.pad")
+    print("Existing keys with the same numbers are replaced; when writing the keys directory,")
+    print(f"the {keystore.store_path} next to it is rebuilt too if it exists, so the two stay in step")
+    print(f"Example: {sys.argv[0]} 1024")
+    print(f"Example: {sys.argv[0]} -jobs 4 -pad 1 100000000")
+
+if __name__ == "__main__":
+    size = int(pop_option("-size", key_size))
+    start = int(pop_option("-start", 1))
+    jobs = int(pop_option("-jobs", 1))
+    directory = pop_option("-dir", keys_dir)
+    store = pop_option("-store", None)
+    pad_id = pop_option("-pad", None)
+    if len(sys.argv) != 2 or not sys.argv[1].isdigit():
+        print_usage()
+        sys.exit(1)
+
+    began = time.perf_counter()
+    try:
+        if pad_id is not None:
+            n_bytes = int(sys.argv[1])
+            path = pads.create_pad(int(pad_id), n_bytes, chunks=random_chunks(n_bytes, jobs))
+            done = f"Wrote {path}"
+        else:
+            count = int(sys.argv[1])
+            n_bytes = count * size
+            keys = generate_keys(count, size, start, jobs)
+            if store is not None:
+                add_to_store(keys, store)
+                done = f"Wrote {count} keys to '{store}'"
+            else:
+                write_key_files(keys, directory)
+                done = f"Wrote {count} keys to '{directory}'"
+                beside = store_beside(directory)
+                if beside is not None and os.path.exists(beside):
+                    keystore.import_keys(directory, beside)
+                    done += f" and rebuilt '{beside}'"
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    elapsed = time.perf_counter() - began
+    print(f"{done}: {n_bytes / 1e6:.1f} MB in {elapsed:.2f} s ({n_bytes / 1e6 / elapsed:.0f} MB/s)")
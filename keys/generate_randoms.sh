@@ -1,4 +1,3 @@
-for i in {1..1024}
-do 
-python3 ../random255bytes.py >$i.bin
-done
+#!/bin/bash
+# Kept for running from inside keys/; generates all 1024 keys in one pass
+python3 ../keygen.py -dir . -start 1 1024
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Packed key store: every key of keys/N.bin in one memory-mapped file.
+#
+# Layout, all little-endian:
+#   header   magic "GCKS", version (u16), 0 (u16), record_size (u32), count (u32), index_size (u32)
+#   index    index_size int32: the record number of key id i at [i], -1 if there is none
+#   records  count of (id u16, length u16, record_size key bytes, zero-padded)
+# Ids are the numbers in the key file names. The 2-byte payload header has
+# room for 0-65535, but ids from 0x8000 up mark pads (see gapchat.pad_flag),
+# so a key id is 0-32767, the index is a plain table and a lookup is two
+# array reads.
+import os
+import sys
+import mmap
+import struct
+import tempfile
+from collections.abc import Mapping
+import numpy as np
+
+# Default location, next to the keys directory it replaces
+store_path = 'keys.store'
+
+magic = b"GCKS"
+version = 1
+header_format = struct.Struct("<4sHHIII")
+
+# Highest key id a payload header can name; gapchat.pad_flag and up are pads
+max_key_id = 0x7FFF
+
+def record_dtype(record_size):
+    return np.dtype([('id', '<u2'), ('length', '<u2'), ('key', 'u1', (record_size,))])
+
+class KeyStore(Mapping):
+    """
+    Keys by numeric id from a packed store file, mapped into memory once.
+
+    Opening reads only the header; the index and records are views on the
+    mapping, so the OS pages in what is used.
+    """
+
+    def __init__(self, path=store_path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < header_format.size:
+            raise ValueError(f"'{path}' is too short to be a key store.")
+        file_magic, file_version, _, record_size, count, index_size = header_format.unpack_from(self.map)
+        if file_magic != magic or file_version != version:
+            raise ValueError(f"'{path}' is not a version {version} key store.")
+
+        dtype = record_dtype(record_size)
+        records_offset = header_format.size + 4 * index_size
+        if len(self.map) < records_offset + count * dtype.itemsize:
+            raise ValueError(f"Key store '{path}' is truncated.")
+        self.index = np.frombuffer(self.map, dtype='<i4', count=index_size, offset=header_format.size)
+        self.records = np.frombuffer(self.map, dtype=dtype, count=count, offset=records_offset)
+        self.ids = self.records['id']
+
+    def __getitem__(self, key_id):
+        if not 0 <= key_id < len(self.index) or self.index[key_id] < 0:
+            raise KeyError(key_id)
+        record = self.records[self.index[key_id]]
+        return record['key'][:record['length']].tobytes()
+
+    def __contains__(self, key_id):
+        return 0 <= key_id < len(self.index) and self.index[key_id] >= 0
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        # Drop the views first; an mmap cannot close while arrays still export
+        # it, and if a caller still holds one the mapping goes when that does
+        self.index = self.records = self.ids = None
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Function to pack {key id: key bytes} into a store file, replacing it atomically
+def write_store(keys, path=store_path):
+    ids = sorted(keys)
+    if ids and not 0 <= ids[0] <= ids[-1] <= max_key_id:
+        raise ValueError(f"Key ids must be between 0 and {max_key_id}; ids from {max_key_id + 1} up mark pads.")
+    record_size = max((len(keys[key_id]) for key_id in ids), default=0)
+    if record_size > 0xFFFF:
+        raise ValueError("Keys longer than 65535 bytes do not fit in a key store record.")
+
+    index = np.full(ids[-1] + 1 if ids else 0, -1, dtype='<i4')
+    index[ids] = np.arange(len(ids))
+    records = np.zeros(len(ids), dtype=record_dtype(record_size))
+    records['id'] = ids
+    records['length'] = [len(keys[key_id]) for key_id in ids]
+    if ids and np.all(records['length'] == record_size):
+        # The usual case, keys of one size: fill all records in one copy
+        records['key'] = np.frombuffer(b"".join(keys[key_id] for key_id in ids), dtype=np.uint8).reshape(len(ids), -1)
+    else:
+        for record, key_id in zip(records, ids):
+            key_bytes = keys[key_id]
+            record['key'][:len(key_bytes)] = np.frombuffer(key_bytes, dtype=np.uint8)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        f.write(header_format.pack(magic, version, 0, record_size, len(ids), len(index)))
+        f.write(index.tobytes())
+        f.write(records.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, path)
+    return len(ids)
+
+# Function to pack every keys/N.bin into a store
+def import_keys(directory, path=store_path):
+    keys = {}
+    for name in os.listdir(directory):
+        stem, extension = os.path.splitext(name)
+        if extension == '.bin' and stem.isdigit():
+            with open(os.path.join(directory, name), 'rb') as f:
+                keys[int(stem)] = f.read()
+    return write_store(keys, path)
+
+# Function to unpack a store into keys/N.bin files
+def export_keys(path, directory):
+    os.makedirs(directory, exist_ok=True)
+    with KeyStore(path) as store:
+        for key_id in store:
+            with open(os.path.join(directory, f"{key_id}.bin"), 'wb') as f:
+                f.write(store[key_id])
+        return len(store)
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} import [keys_dir] [store]")
+    print(f"       {sys.argv[0]} export [store] [keys_dir]")
+    print(f"       {sys.argv[0]} info [store]")
+    print(f"Defaults: keys_dir is keys, store is {store_path}")
+    print(f"Example: {sys.argv[0]} import keys {store_path}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export", "info"):
+        print_usage()
+        sys.exit(1)
+
+    try:
+        if sys.argv[1] == "import":
+            directory = sys.argv[2] if len(sys.argv) > 2 else 'keys'
+            path = sys.argv[3] if len(sys.argv) > 3 else store_path
+            print(f"Packed {import_keys(directory, path)} keys from '{directory}' into '{path}'")
+        elif sys.argv[1] == "export":
+            path = sys.argv[2] if len(sys.argv) > 2 else store_path
+            directory = sys.argv[3] if len(sys.argv) > 3 else 'keys'
+            print(f"Wrote {export_keys(path, directory)} keys from '{path}' to '{directory}'")
+        else:
+            path = sys.argv[2] if len(sys.argv) > 2 else store_path
+            with KeyStore(path) as store:
+                ids = store.ids
+                print(f"{path}: {len(store)} keys, ids {ids.min() if len(ids) else '-'} to "
+                      f"{ids.max() if len(ids) else '-'}, {store.records.dtype['key'].shape[0]}-byte records")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
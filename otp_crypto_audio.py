@@ -5,32 +5,128 @@ import os
 import sys
 import random
 import binascii
+import profiling
+from compression import compress_message, decompress_message
+from keystore import KeyStore, store_path
+import pads
+from xor_engine import xor_bytes
 
 # Directory where the binary keys are stored
 keys_dir = 'keys'
 
 # Function to XOR input bytes with key bytes
 def encrypt_bytes(input_bytes, key_bytes):
-    if len(input_bytes) > len(key_bytes):
-        raise ValueError("Key is too short for the input data.")
-    return bytearray(b ^ k for b, k in zip(input_bytes, key_bytes))
+    with profiling.stage("encrypt_bytes", len(input_bytes)):
+        return xor_bytes(input_bytes, key_bytes)
 
 # Function to convert encrypted bytes to DTMF-like text
 def bytes_to_dtmf(encrypted_bytes):
-    hex_output = ''.join(f"{byte:02X}" for byte in encrypted_bytes)
-    return hex_output.replace('E', '*').replace('F', '#')
+    with profiling.stage("bytes_to_dtmf", len(encrypted_bytes)):
+        hex_output = ''.join(f"{byte:02X}" for byte in encrypted_bytes)
+        return hex_output.replace('E', '*').replace('F', '#')
 
 # Function to convert DTMF-like text back to bytes
 def dtmf_to_bytes(dtmf_text):
-    hex_text = dtmf_text.replace('*', 'E').replace('#', 'F')
-    return binascii.unhexlify(hex_text)
+    with profiling.stage("dtmf_to_bytes", len(dtmf_text)):
+        hex_text = dtmf_text.replace('*', 'E').replace('#', 'F')
+        return binascii.unhexlify(hex_text)
+
+# Function to list the key files in the keys directory
+def list_keys(directory=keys_dir):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if name.endswith('.bin'))
+
+# Function to read one binary key
+def read_key(key_file, directory=keys_dir):
+    with open(os.path.join(directory, key_file), 'rb') as f:
+        return f.read()
+
+# Function to read every key at once, for long-running processes
+def load_keys(directory=keys_dir):
+    return {key_file: read_key(key_file, directory) for key_file in list_keys(directory)}
+
+# Function to pick a random key as (file name, key bytes): from the packed key
+# store when there is one, without scanning the keys directory
+def choose_key(directory=keys_dir, store=store_path):
+    if os.path.exists(store):
+        with KeyStore(store) as keys:
+            if len(keys):
+                key_id = int(random.choice(keys.ids))
+                return f"{key_id}.bin", keys[key_id]
+    key_files = list_keys(directory)
+    if not key_files:
+        raise FileNotFoundError(f"No key files found in '{directory}'")
+    key_file = random.choice(key_files)
+    return key_file, read_key(key_file, directory)
+
+# Function to read the key named N.bin, from the packed key store when there is one
+def find_key(key_file, directory=keys_dir, store=store_path):
+    stem = os.path.splitext(key_file)[0]
+    if os.path.exists(store) and stem.isdigit():
+        with KeyStore(store) as keys:
+            if int(stem) in keys:
+                return keys[int(stem)]
+    try:
+        return read_key(key_file, directory)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Key file '{key_file}' not found in '{directory}'.")
+
+# Function to encrypt a message into the FILENAME.bin_HHHH form, optionally compressed first
+def encrypt_message(message, key_file, key_bytes, compress=False):
+    message_bytes = message.encode('utf-8')
+    if compress:
+        message_bytes = compress_message(message_bytes)
+    encrypted_bytes = encrypt_bytes(message_bytes, key_bytes)
+    return f"{key_file}_{bytes_to_dtmf(encrypted_bytes)}"
+
+# Function to encrypt a message with the next unused range of a pads.Pad, into the P.pad@OFFSET_HHHH form
+def encrypt_with_pad(message, pad, compress=False):
+    message_bytes = message.encode('utf-8')
+    if compress:
+        message_bytes = compress_message(message_bytes)
+    offset = pad.allocate(len(message_bytes))
+    encrypted_bytes = encrypt_bytes(message_bytes, pad.read(offset, len(message_bytes)))
+    return f"{pads.pad_file_name(pad.pad_id)}@{offset}_{bytes_to_dtmf(encrypted_bytes)}"
+
+# Function to read the pad bytes named by P.pad@OFFSET for a message, recording them as used
+def read_pad_range(key_file, length, directory=pads.pads_dir):
+    pad_file, offset = key_file.split('@', 1)
+    try:
+        pad = pads.Pad(int(os.path.splitext(pad_file)[0]), directory)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Pad file '{pad_file}' not found in '{directory}'.")
+    with pad:
+        pad.mark_used(int(offset), length)  # Refuses a range this side also sent with
+        key_bytes = pad.read(int(offset), length)
+    return key_bytes
+
+# Function to split FILENAME.bin_HHHH into the key file name and encrypted bytes
+def parse_encrypted(input_data):
+    try:
+        key_file, dtmf_text = input_data.split('_', 1)
+    except ValueError:
+        raise ValueError("Invalid input format. Expected FILENAME.bin_HHHH.")
+    return key_file, dtmf_to_bytes(dtmf_text)
 
 # Main function
 def main():
+    profiling.from_argv(sys.argv)
+    compress = "-z" in sys.argv
+    if compress:
+        sys.argv.remove("-z")
+    # Imported here: the rest of this module runs without DTMFdecode's numpy/scipy
+    from DTMFdecode import pop_option
+    pad_id = pop_option("-pad", None)
+    pad_id = int(pad_id) if pad_id is not None else None
+
     if len(sys.argv) < 2:
         print("Usage:")
-        print("  Encrypt: python otp_crypto.py <text_to_encrypt>")
-        print("  Decrypt: python otp_crypto.py -d <FILENAME.bin_HHHH>")
+        print("  Encrypt: python otp_crypto.py [--profile] [-z] [-pad ID] <text_to_encrypt>")
+        print("  Decrypt: python otp_crypto.py -d [-z] <FILENAME.bin_HHHH | ID.pad@OFFSET_HHHH>")
+        print("  -z compresses before encrypting; the receiver must then decrypt with -z too")
+        print(f"  -pad encrypts with the next unused bytes of {pads.pads_dir}/ID.pad instead of a random key file")
+        print("  (each end sends from its own end of the pad: run pads.py side ID front at one end, back at the other)")
         sys.exit(1)
 
     if sys.argv[1] == "-d":
@@ -39,26 +135,23 @@ def main():
             print("Error: Missing encrypted message for decryption.")
             sys.exit(1)
         
-        # Parse the input
-        input_data = sys.argv[2]
+        # Parse the input and convert DTMF text back to bytes
         try:
-            key_file, dtmf_text = input_data.split('_', 1)
-        except ValueError:
-            print("Error: Invalid input format. Expected FILENAME.bin_HHHH.")
+            key_file, encrypted_bytes = parse_encrypted(sys.argv[2])
+        except ValueError as e:
+            print(f"Error: {e}")
             sys.exit(1)
 
-        # Read the key file
-        key_path = os.path.join(keys_dir, key_file)
-        if not os.path.exists(key_path):
-            print(f"Error: Key file '{key_file}' not found in '{keys_dir}'.")
+        # Look the key up in the key store or the keys directory, or read the pad range
+        try:
+            if '@' in key_file:
+                key_bytes = read_pad_range(key_file, len(encrypted_bytes))
+            else:
+                key_bytes = find_key(key_file)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
             sys.exit(1)
 
-        with open(key_path, 'rb') as f:
-            key_bytes = f.read()
-
-        # Convert DTMF text back to bytes
-        encrypted_bytes = dtmf_to_bytes(dtmf_text)
-
         # Decrypt the message
         try:
             decrypted_bytes = encrypt_bytes(encrypted_bytes, key_bytes)
@@ -67,37 +160,42 @@ def main():
             sys.exit(1)
 
         # Output the decrypted message
+        try:
+            if compress:
+                decrypted_bytes = decompress_message(decrypted_bytes)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
         print(decrypted_bytes.decode('utf-8'))
     else:
         # Encryption mode
         message = sys.argv[1]
-        input_bytes = message.encode('utf-8')
 
-        # Check if the keys directory exists and has files
-        if not os.path.exists(keys_dir) or not os.listdir(keys_dir):
-            print(f"Error: No key files found in '{keys_dir}'")
-            sys.exit(1)
+        if pad_id is not None:
+            try:
+                with pads.Pad(pad_id) as pad:
+                    print(encrypt_with_pad(message, pad, compress))
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            return
 
-        # Select a random binary key file
-        key_file = random.choice(os.listdir(keys_dir))
-        key_path = os.path.join(keys_dir, key_file)
-        
-        # Read the binary key
-        with open(key_path, 'rb') as f:
-            key_bytes = f.read()
+        # Select a random key from the key store or the keys directory
+        try:
+            key_file, key_bytes = choose_key()
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
 
-        # Encrypt the input bytes using the key
+        # Encrypt the input bytes using the key and convert them to DTMF-like text
         try:
-            encrypted_bytes = encrypt_bytes(input_bytes, key_bytes)
+            encrypted_text = encrypt_message(message, key_file, key_bytes, compress)
         except ValueError as e:
             print(f"Error: {e}")
             sys.exit(1)
 
-        # Convert encrypted bytes to DTMF-like text
-        dtmf_output = bytes_to_dtmf(encrypted_bytes)
-
         # Output the result
-        print(f"{key_file}_{dtmf_output}")
+        print(encrypted_text)
 
 if __name__ == "__main__":
     main()
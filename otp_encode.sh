@@ -1,6 +1,2 @@
 rm dtmf.wav
-python3 get_input.py > otp_input.txt
-
-python otp_crypto_audio.py "$(cat otp_input.txt)" >otp_encrypted_input.txt
-./encode.sh "$(cat otp_encrypted_input.txt)" dtmf.wav 0.1
-
+python3 get_input.py | python3 gapchat.py encode telephony > dtmf.wav
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Large one-time pads, each range used for one message, instead of one 255-byte key file per message.
+#
+# Pad P is pads/P.pad, random bytes shared in advance like keys/N.bin. Both
+# ends send with the same pad, so each end has its own direction: the front
+# end takes ranges upwards from offset 0, the back end downwards from the end
+# of the pad, and the pad is used up when the two meet. The direction is
+# chosen once per end (pads.py side P front|back, opposite at the other end).
+#
+# pads/P.ledger records every range in use as fixed 16-byte records (offset
+# u64, length u32, kind u32, little-endian): ranges allocated here for
+# sending, ranges seen in received messages, and the side marker. A range is
+# appended and fsynced before it is used, so a crash can waste pad bytes but
+# never hand the same ones out twice; a torn last record is cut off when the
+# ledger is next read. A received range that overlaps bytes this end has sent
+# with is refused: it means both ends used them.
+import os
+import sys
+import mmap
+import fcntl
+import struct
+
+pads_dir = 'pads'
+
+ledger_record = struct.Struct("<QII")
+
+# Ledger record kinds. A side record has offset 0 for front, 1 for back.
+sent, received, side_marker = 0, 1, 2
+sides = ('front', 'back')
+
+# Function to name pad files; the payload header carries P
+def pad_file_name(pad_id):
+    return f"{pad_id}.pad"
+
+class Pad:
+    """
+    One pad and its ledger. Allocation is O(1): the ledger is folded into
+    the extent of the ranges sent and received, read once when the pad is
+    opened and then only from where the last read stopped.
+    """
+
+    def __init__(self, pad_id, directory=pads_dir):
+        self.pad_id = pad_id
+        path = os.path.join(directory, pad_file_name(pad_id))
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.map)
+        self.ledger = os.open(os.path.splitext(path)[0] + ".ledger", os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        self.ledger_read = 0
+        self.side = None
+        # [start, end) spans of the ranges sent and received; empty while start >= end
+        self.sent_start, self.sent_end = self.size, 0
+        self.received_start, self.received_end = self.size, 0
+        fcntl.flock(self.ledger, fcntl.LOCK_EX)
+        try:
+            self.catch_up()
+        finally:
+            fcntl.flock(self.ledger, fcntl.LOCK_UN)
+
+    # Fold ledger records appended since the last read (by any process) into the
+    # spans. Called with the ledger locked, so a partial record at the end can
+    # only be left by a crash, and is cut off before anything is appended.
+    def catch_up(self):
+        end = os.fstat(self.ledger).st_size
+        complete = end - (end - self.ledger_read) % ledger_record.size
+        if complete > self.ledger_read:
+            records = os.pread(self.ledger, complete - self.ledger_read, self.ledger_read)
+            for offset, length, kind in ledger_record.iter_unpack(records):
+                self.fold(offset, length, kind)
+            self.ledger_read = complete
+        if complete < end:
+            os.ftruncate(self.ledger, complete)
+
+    def fold(self, offset, length, kind):
+        if kind == side_marker:
+            self.side = sides[offset]
+        elif kind == sent:
+            self.sent_start, self.sent_end = min(self.sent_start, offset), max(self.sent_end, offset + length)
+        else:
+            self.received_start = min(self.received_start, offset)
+            self.received_end = max(self.received_end, offset + length)
+
+    # Append a record and fold it in; call with the ledger locked and caught up
+    def record(self, offset, length, kind):
+        os.write(self.ledger, ledger_record.pack(offset, length, kind))
+        os.fsync(self.ledger)
+        self.fold(offset, length, kind)
+        self.ledger_read += ledger_record.size  # Our own record; the lock kept others out
+
+    # Function to choose which end of the pad this side sends from, once
+    def set_side(self, side):
+        if side not in sides:
+            raise ValueError(f"Side must be one of {', '.join(sides)}.")
+        fcntl.flock(self.ledger, fcntl.LOCK_EX)
+        try:
+            self.catch_up()
+            if self.side is not None and self.side != side:
+                raise ValueError(f"Pad {self.pad_id} already sends from the {self.side}.")
+            if self.side is None:
+                self.record(sides.index(side), 0, side_marker)
+        finally:
+            fcntl.flock(self.ledger, fcntl.LOCK_UN)
+
+    # The unused [start, end) between this side's ranges and the other side's
+    def free_span(self):
+        if self.side == 'front':
+            return self.sent_end, self.received_start
+        return self.received_end, self.sent_start
+
+    def allocate(self, length):
+        """
+        Reserve the next length unused bytes of this side's part of the pad
+        and return their offset.
+
+        Raises ValueError when no side is set or the pad does not have
+        length bytes left.
+        """
+        fcntl.flock(self.ledger, fcntl.LOCK_EX)
+        try:
+            self.catch_up()
+            if self.side is None:
+                raise ValueError(f"Pad {self.pad_id} has no side set; run 'pads.py side {self.pad_id} front' "
+                                 f"at one end and 'pads.py side {self.pad_id} back' at the other.")
+            start, end = self.free_span()
+            if end - start < length:
+                raise ValueError(f"Pad {self.pad_id} has {max(end - start, 0)} bytes left; {length} are needed.")
+            offset = start if self.side == 'front' else end - length
+            self.record(offset, length, sent)
+            return offset
+        finally:
+            fcntl.flock(self.ledger, fcntl.LOCK_UN)
+
+    # Function to record a range used by the other side, so this side never sends with it.
+    # Raises ValueError if this side has sent with any of it: the pad bytes were used twice.
+    def mark_used(self, offset, length):
+        self.check_range(offset, length)  # Before anything is recorded: a bad header must not use up the pad
+        fcntl.flock(self.ledger, fcntl.LOCK_EX)
+        try:
+            self.catch_up()
+            if offset < self.sent_end and offset + length > self.sent_start:
+                raise ValueError(f"Range {offset}+{length} of pad {self.pad_id} overlaps bytes this side sent "
+                                 f"with; both sides used them, so neither message is safe.")
+            if offset < self.received_start or offset + length > self.received_end:
+                self.record(offset, length, received)
+        finally:
+            fcntl.flock(self.ledger, fcntl.LOCK_UN)
+
+    def check_range(self, offset, length):
+        if offset < 0 or length < 0 or offset + length > self.size:
+            raise ValueError(f"Range {offset}+{length} is outside pad {self.pad_id} of {self.size} bytes.")
+
+    def read(self, offset, length):
+        self.check_range(offset, length)
+        return self.map[offset:offset + length]
+
+    @property
+    def remaining(self):
+        start, end = self.free_span()
+        return max(end - start, 0)
+
+    def close(self):
+        self.map.close()
+        os.close(self.ledger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Function to write a new pad of size bytes from the OS random source, or from
+# chunks of random bytes when given (see keygen.random_chunks)
+def create_pad(pad_id, size, directory=pads_dir, chunks=None, chunk_size=1 << 20):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, pad_file_name(pad_id))
+    if chunks is None:
+        chunks = (os.urandom(min(chunk_size, size - start)) for start in range(0, size, chunk_size))
+    with open(path, 'xb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return path
+
+def print_usage():
+    print(f"Usage: {sys.argv[0]} create PAD_ID SIZE")
+    print(f"       {sys.argv[0]} side PAD_ID front|back")
+    print(f"       {sys.argv[0]} info PAD_ID")
+    print(f"Pads live in {pads_dir}/PAD_ID.pad; SIZE is in bytes")
+    print("Before sending, one end sets side front and the other side back")
+    print(f"Example: {sys.argv[0]} create 1 4000000")
+    print(f"Example: {sys.argv[0]} side 1 front")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("create", "side", "info") or \
+            (sys.argv[1] in ("create", "side") and len(sys.argv) < 4):
+        print_usage()
+        sys.exit(1)
+
+    try:
+        pad_id = int(sys.argv[2])
+        if sys.argv[1] == "create":
+            print(f"Wrote {create_pad(pad_id, int(sys.argv[3]))}")
+        elif sys.argv[1] == "side":
+            with Pad(pad_id) as pad:
+                pad.set_side(sys.argv[3])
+                print(f"Pad {pad_id} sends from the {pad.side}")
+        else:
+            with Pad(pad_id) as pad:
+                side = f"sends from the {pad.side}" if pad.side else "no side set"
+                print(f"Pad {pad_id}: {pad.size} bytes, {side}, {pad.remaining} left")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,89 @@
+# Per-stage timing and counters for the encoder, decoder and crypto code.
+#
+# Off by default. Switch it on with --profile on the command line of any
+# GapChatAudio script, or with GAPCHAT_PROFILE=1 (report to stderr) or
+# GAPCHAT_PROFILE=/path/to/file.jsonl (append one JSON line per run).
+import os
+import sys
+import json
+import time
+import atexit
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+enabled = False
+destination = None
+stages = {}
+counters = {}
+
+class Stage:
+    """
+    Time one run of a stage. samples may be set inside the block when the
+    amount of work is only known at the end.
+    """
+
+    def __init__(self, name, samples=0):
+        self.name = name
+        self.samples = samples
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if enabled:
+            record = stages.setdefault(self.name, {"calls": 0, "seconds": 0.0, "samples": 0})
+            record["calls"] += 1
+            record["seconds"] += time.perf_counter() - self.start
+            record["samples"] += int(self.samples)
+
+def stage(name, samples=0):
+    return Stage(name, samples)
+
+def count(name, n=1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+# Peak resident memory of this process in bytes, if the platform reports it
+def peak_memory():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def report():
+    result = {"argv": sys.argv, "stages": {}, "counters": dict(counters), "peak_memory_bytes": peak_memory()}
+    for name, record in stages.items():
+        result["stages"][name] = dict(record)
+        if record["samples"] and record["seconds"]:
+            result["stages"][name]["samples_per_sec"] = record["samples"] / record["seconds"]
+    return result
+
+def emit():
+    line = json.dumps(report())
+    if destination:
+        with open(destination, "a") as f:
+            f.write(line + "\n")
+    else:
+        print(line, file=sys.stderr)
+
+def enable(path=None):
+    global enabled, destination
+    if not enabled:
+        atexit.register(emit)
+    enabled = True
+    destination = path
+
+# Handle --profile in a script's argv (removing it) and GAPCHAT_PROFILE
+def from_argv(argv):
+    if "--profile" in argv:
+        argv.remove("--profile")
+        enable()
+
+setting = os.environ.get("GAPCHAT_PROFILE", "")
+if setting and setting != "0":
+    enable(None if setting == "1" else setting)
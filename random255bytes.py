@@ -1,12 +1,9 @@
-import random
+import os
 import sys
-from datetime import datetime
 
-# Seed the random number generator with the current timestamp
-random.seed(datetime.now().timestamp())
+# Number of random bytes, 255 unless given
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 255
 
-# Generate 255 random bytes
-result = bytearray(random.randint(0, 255) for _ in range(255))
-
-# Write the bytes directly to stdout
-sys.stdout.buffer.write(result)
+# Read them from the OS random source (the former random.randint seeded from the
+# clock is predictable, which a one-time pad cannot afford) and write them to stdout
+sys.stdout.buffer.write(os.urandom(size))
@@ -1,27 +1,51 @@
 import sys
+import queue
 import threading
-from PyQt5.QtWidgets import QApplication, QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QSlider
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QApplication, QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QSlider, QLabel
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 import sounddevice as sd
 import numpy as np
 import wave
 import simpleaudio as sa
+from DTMFdecode import BlockDecoder, profile_durations
 
 
 class AudioRecorder(QDialog):
-    def __init__(self):
+    # Emitted from the decoder thread, delivered on the GUI thread
+    digits_decoded = pyqtSignal(str)
+    message_ended = pyqtSignal()
+
+    def __init__(self, silence_timeout=1.5, terminator=None, timing='classic', max_duration=30):
         super().__init__()
 
         # Initialize UI
+        self.max_duration = max_duration
         self.init_ui()
 
-        # Audio recording variables
+        # Audio recording variables. Samples go straight into one int16 buffer
+        # sized for the longest recording; playback, seeking and saving use
+        # views of it, so nothing is copied or converted after capture
         self.fs = 44100  # Sampling frequency
         self.recording = False
-        self.audio_data = []  # To store recorded audio
+        self.audio_buffer = np.zeros(int(max_duration * self.fs), dtype=np.int16)
+        self.recorded = 0  # Samples of audio_buffer filled so far
         self.stream = None
         self.timer = QTimer()
-        self.timer.timeout.connect(self.stop_recording)  # Stop recording after 30 seconds
+        self.timer.timeout.connect(self.stop_recording)  # Stop recording after max_duration seconds
+
+        # Live decoding: audio_callback queues blocks for a decoder thread, which
+        # ends the message after silence_timeout seconds without a new digit
+        # or when it sees the terminator symbol. timing is the sender's timing
+        # profile; gapless profiles have no gaps to cut at, so they are only
+        # recorded, not shown live
+        self.silence_timeout = silence_timeout
+        self.terminator = terminator
+        self.timing = timing
+        self.block_queue = None
+        self.decoder_thread = None
+        self.decoded_digits = ""
+        self.digits_decoded.connect(self.show_digits)
+        self.message_ended.connect(self.end_of_message)
 
         # Slider and playback variables
         self.playback_obj = None
@@ -36,10 +60,13 @@ class AudioRecorder(QDialog):
         # Slider
         self.slider = QSlider(Qt.Horizontal)
         self.slider.setMinimum(0)
-        self.slider.setMaximum(30000)  # 30 seconds in milliseconds
+        self.slider.setMaximum(self.max_duration * 1000)  # In milliseconds
         self.slider.setValue(0)
         self.slider.sliderMoved.connect(self.slider_moved)
 
+        # Digits decoded so far
+        self.digits_label = QLabel("")
+
         # Buttons
         self.record_button = QPushButton("Record")
         self.stop_button = QPushButton("Stop")
@@ -56,6 +83,7 @@ class AudioRecorder(QDialog):
         # Layouts
         layout = QVBoxLayout()
         layout.addWidget(self.slider)
+        layout.addWidget(self.digits_label)
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.record_button)
@@ -69,13 +97,22 @@ class AudioRecorder(QDialog):
 
     def start_recording(self):
         if not self.recording:
+            if self.playing:
+                self.stop_playback()  # Playback reads the buffer about to be overwritten
             self.recording = True
-            self.audio_data = []  # Clear previous recordings
+            self.recorded = 0  # Clear previous recordings
+            self.decoded_digits = ""
+            self.digits_label.setText("")
             self.slider.setValue(0)
-            self.timer.start(30000)  # Set 30-second timer
+            if profile_durations(self.timing)["min_silence_duration"]:
+                self.block_queue = queue.Queue()
+                self.decoder_thread = threading.Thread(target=self.decode_blocks, args=(self.block_queue,), daemon=True)
+                self.decoder_thread.start()
+            self.timer.start(self.max_duration * 1000)
             self.stream = sd.InputStream(
                 samplerate=self.fs,
                 channels=1,
+                dtype='int16',
                 callback=self.audio_callback
             )
             # Start the recording in a separate thread
@@ -96,34 +133,34 @@ class AudioRecorder(QDialog):
                 self.stream.stop()
                 self.stream.close()
                 self.stream = None
+            if self.block_queue:
+                self.block_queue.put(None)  # Let the decoder thread finish
+                self.block_queue = None
             print("Recording stopped.")
 
         if self.playing:
             self.stop_playback()
 
+    # The recorded part of audio_buffer, without copying
+    def recorded_audio(self, start=0):
+        return self.audio_buffer[min(start, self.recorded):self.recorded]
+
     def save_audio(self):
-        if self.audio_data:
-            # Combine all recorded audio chunks
-            audio_array = np.concatenate(self.audio_data, axis=0)
-            # Scale from [-1.0, 1.0] to 16-bit integer range [-32768, 32767]
-            audio_array = (audio_array * 32767).astype(np.int16)
-            # Save to a WAV file
+        if self.recorded:
+            # Save to a WAV file, straight from the buffer
             with wave.open("dtmf.wav", "w") as wf:
                 wf.setnchannels(1)  # Mono
                 wf.setsampwidth(2)  # 16 bits per sample
                 wf.setframerate(self.fs)
-                wf.writeframes(audio_array.tobytes())
+                wf.writeframes(memoryview(self.recorded_audio()).cast('B'))
             print("Audio saved as dtmf.wav")
         else:
             print("No audio to save.")
 
     def play_audio(self):
-        if not self.playing and self.audio_data:
-            # Combine all recorded audio chunks
-            audio_array = np.concatenate(self.audio_data, axis=0)
+        if not self.playing and self.recorded:
             # Start playback
-            self.audio_wave = (audio_array * 32767).astype(np.int16)  # Convert to 16-bit PCM
-            self.playback_obj = sa.play_buffer(self.audio_wave, 1, 2, self.fs)
+            self.playback_obj = sa.play_buffer(self.recorded_audio(), 1, 2, self.fs)
             self.playing = True
             self.slider.setValue(0)
             self.playback_timer.start(10)  # Update every 10 ms
@@ -139,14 +176,14 @@ class AudioRecorder(QDialog):
     def update_slider_during_recording(self):
         if self.recording:
             current_position = self.slider.value()
-            if current_position < 30000:
+            if current_position < self.slider.maximum():
                 self.slider.setValue(current_position + 10)
                 QTimer.singleShot(10, self.update_slider_during_recording)
 
     def update_slider_position(self):
         if self.playback_obj and self.playing:
             position = self.slider.value()
-            if position < 30000:
+            if position < self.slider.maximum():
                 self.slider.setValue(position + 10)
             else:
                 self.stop_playback()
@@ -157,20 +194,62 @@ class AudioRecorder(QDialog):
             new_position = int(value / 1000 * self.fs)  # Convert slider value to samples
             if self.playback_obj:
                 self.stop_playback()
-                start_sample = new_position
-                audio_array = np.concatenate(self.audio_data, axis=0)
-                self.audio_wave = (audio_array[start_sample:] * 32767).astype(np.int16)
-                self.playback_obj = sa.play_buffer(self.audio_wave, 1, 2, self.fs)
+                self.playback_obj = sa.play_buffer(self.recorded_audio(new_position), 1, 2, self.fs)
                 self.playing = True
                 self.playback_timer.start(10)
 
     def audio_callback(self, indata, frames, time, status):
         if self.recording:
-            self.audio_data.append(indata.copy())
+            start = self.recorded
+            end = min(start + frames, len(self.audio_buffer))
+            self.audio_buffer[start:end] = indata[:end - start, 0]
+            self.recorded = end
+            # The decoder gets a view: that part of the buffer is not written again
+            if self.block_queue and end > start:
+                self.block_queue.put_nowait(self.audio_buffer[start:end])
+
+    def decode_blocks(self, block_queue):
+        # Runs on the decoder thread until stop_recording queues None
+        decoder = BlockDecoder(self.fs, adaptive=True, **profile_durations(self.timing))
+        timeout_samples = int(self.silence_timeout * self.fs)
+        samples_since_digit = 0
+        heard_digit = False
+
+        while True:
+            block = block_queue.get()
+            if block is None:
+                break
+
+            digits = "".join(decoder.feed(block))
+            samples_since_digit += len(block)
+            if digits:
+                samples_since_digit = 0
+                heard_digit = True
+                if self.terminator and self.terminator in digits:
+                    self.digits_decoded.emit(digits.split(self.terminator, 1)[0])
+                    self.message_ended.emit()
+                    break
+                self.digits_decoded.emit(digits)
+
+            if heard_digit and samples_since_digit >= timeout_samples:
+                self.message_ended.emit()
+                break
+
+    def show_digits(self, digits):
+        self.decoded_digits += digits
+        self.digits_label.setText(self.decoded_digits)
+
+    def end_of_message(self):
+        # Stop as soon as the message is complete, save it for the decode step and close
+        if self.recording:
+            self.stop_recording()
+            self.save_audio()
+            print(f"End of message: {self.decoded_digits}")
+            self.accept()
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    dialog = AudioRecorder()
+    dialog = AudioRecorder(timing=sys.argv[1] if len(sys.argv) > 1 else 'classic')
     dialog.show()
     sys.exit(app.exec_())
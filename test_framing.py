@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Frames must survive errors and erasures up to the Reed-Solomon capacity in
+# every codeword, whatever the detector's confidence says. Run with pytest.
+import random
+import framing
+
+# Damage every codeword of a frame: n_errors confidently wrong symbols and n_erasures unheard ones
+def damaged_frame(rng, payload, n_errors, n_erasures, parity=framing.default_parity):
+    symbols = list(framing.frame_digits(payload, parity))
+    confidence = [rng.uniform(1, 100) for _ in symbols]
+    position = len(framing.preamble)
+    while position < len(symbols):
+        n = min(framing.field_size, len(symbols) - position)
+        chosen = rng.sample(range(position, position + n), n_errors + n_erasures)
+        for i in chosen[:n_errors]:
+            symbols[i] = rng.choice([d for d in framing.nibble_digits if d != symbols[i]])
+            confidence[i] = 100.0
+        for i in chosen[n_errors:]:
+            symbols[i] = '?'
+        position += n
+    return symbols, confidence
+
+def check_unframes(n_errors, n_erasures, trials=100, seed=1):
+    rng = random.Random(seed)
+    for _ in range(trials):
+        payload = bytes(rng.randrange(256) for _ in range(rng.randrange(1, 40)))
+        symbols, confidence = damaged_frame(rng, payload, n_errors, n_erasures)
+        assert framing.unframe(symbols, confidence) == payload
+
+def test_clean_frame():
+    check_unframes(0, 0)
+
+def test_confident_errors():
+    check_unframes(2, 0)
+
+def test_errors_and_erasures():
+    check_unframes(1, 2)
+
+def test_erasures():
+    check_unframes(0, 4)
+
+def test_errors_without_confidence():
+    rng = random.Random(2)
+    payload = b"attack at dawn"
+    symbols, _ = damaged_frame(rng, payload, 2, 0)
+    assert framing.unframe(symbols) == payload
+
+def test_noise_before_frame():
+    rng = random.Random(3)
+    payload = b"\x00\x01\x02"
+    symbols, confidence = damaged_frame(rng, payload, 1, 1)
+    noise = list("#D*") + [rng.choice(framing.nibble_digits) for _ in range(20)]
+    assert framing.unframe(noise + symbols, [1.0] * len(noise) + confidence) == payload
+
+def test_beyond_repair():
+    rng = random.Random(4)
+    symbols, confidence = damaged_frame(rng, b"too much damage", 0, 5)
+    try:
+        framing.unframe(symbols, confidence)
+    except ValueError:
+        return
+    assert False, "a frame with 5 erasures per codeword was decoded"
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# A received range that cannot be valid must never use up any of the pad:
+# out of range, negative, or overlapping what this side sent. Run with pytest.
+import os
+import pads
+
+def open_pad(tmp_path, side='back', size=1000):
+    pads.create_pad(1, size, directory=str(tmp_path))
+    pad = pads.Pad(1, str(tmp_path))
+    pad.set_side(side)
+    return pad
+
+def check_refused(tmp_path, offset, length, side='back'):
+    with open_pad(tmp_path, side) as pad:
+        pad.allocate(10)
+        remaining = pad.remaining
+        ledger_size = pad.ledger_read
+        try:
+            pad.mark_used(offset, length)
+        except ValueError:
+            pass
+        else:
+            assert False, f"range {offset}+{length} was accepted"
+        assert pad.remaining == remaining
+    # Nothing was written either: a fresh look at the ledger agrees
+    with pads.Pad(1, str(tmp_path)) as pad:
+        assert pad.remaining == remaining
+        assert os.path.getsize(os.path.join(str(tmp_path), "1.ledger")) == ledger_size
+
+def test_past_the_end(tmp_path):
+    check_refused(tmp_path, 995, 8)
+
+def test_far_past_the_end(tmp_path):
+    check_refused(tmp_path, 1 << 40, 8)
+
+def test_negative_offset(tmp_path):
+    check_refused(tmp_path, -5, 8)
+
+def test_overlaps_sent(tmp_path):
+    # The back side sent with [990, 1000)
+    check_refused(tmp_path, 985, 8)
+
+def test_overlaps_sent_front(tmp_path):
+    check_refused(tmp_path, 5, 8, side='front')
+
+def test_received_range_is_kept(tmp_path):
+    with open_pad(tmp_path, 'back') as pad:
+        pad.allocate(10)
+        pad.mark_used(0, 100)
+        assert pad.remaining == 1000 - 10 - 100
+        assert pad.allocate(5) == 985